@@ -5,11 +5,13 @@ Main module for the API
 from os import getenv
 from flask import Flask, jsonify, abort, request
 from flask_cors import CORS
+from api.v1.json_provider import FastJSONProvider
 from api.v1.views import app_views
 from api.v1.auth.basic_auth import BasicAuth
 from api.v1.auth.auth import Auth
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 
@@ -2,18 +2,25 @@
 """Module of Users views.
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import abort, current_app, jsonify, request, Response
 from models.user import User
 
 
+def _json_response(body: str, status: int = 200) -> Response:
+    """Build a response from a JSON document encoded like `jsonify`.
+    """
+    return current_app.response_class(body + '\n', status=status,
+                                      mimetype='application/json')
+
+
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """GET /api/v1/users
     Return:
       - list of all User objects JSON represented.
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    all_users = ','.join(user.to_json_str() for user in User.all())
+    return _json_response('[' + all_users + ']')
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -30,7 +37,7 @@ def view_one_user(user_id: str = None) -> str:
     user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    return _json_response(user.to_json_str())
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -83,7 +90,7 @@ def create_user() -> str:
             user.first_name = rj.get("first_name")
             user.last_name = rj.get("last_name")
             user.save()
-            return jsonify(user.to_json()), 201
+            return _json_response(user.to_json_str(), 201)
         except Exception as e:
             error_msg = "Can't create User: {}".format(e)
     return jsonify({'error': error_msg}), 400
@@ -119,5 +126,5 @@ def update_user(user_id: str = None) -> str:
     if rj.get('last_name') is not None:
         user.last_name = rj.get('last_name')
     user.save()
-    return jsonify(user.to_json()), 200
+    return _json_response(user.to_json_str())
 
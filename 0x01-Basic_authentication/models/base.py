@@ -1,20 +1,53 @@
 #!/usr/bin/env python3
 """Base module
 """
-import json
 import uuid
-from os import path
+from os import getenv, path
 from datetime import datetime
 from typing import TypeVar, List, Iterable
 
+from models import fast_json, sqlite_store
+
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+# Persist to one SQLite table per class instead of one JSON file
+SQLITE = getenv('MODEL_STORE', 'json') == 'sqlite'
+
+
+def utcnow() -> datetime:
+    """Current UTC time
+    """
+    return datetime.utcnow()
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse a timestamp written in TIMESTAMP_FORMAT
+
+    `fromisoformat` is much faster than `strptime`, but also accepts
+    dates alone and UTC offsets: it only parses strings laid out like
+    TIMESTAMP_FORMAT, which has no room for an offset, and `strptime`
+    the others, rejecting what it always rejected.
+    """
+    if len(value) == 19 and value[10] == 'T' and \
+            value[13] == value[16] == ':':
+        return datetime.fromisoformat(value)
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def format_timestamp(value: datetime) -> str:
+    """Format a timestamp in TIMESTAMP_FORMAT
+    """
+    if value.tzinfo is not None:
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value.isoformat(timespec='seconds')
 
 
 class Base():
     """Base class.
     """
+    # Attributes stored in indexed columns by the SQLite store
+    INDEXED_ATTRIBUTES = ()
 
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize a Base
@@ -25,15 +58,13 @@ class Base():
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
-            self.created_at = datetime.utcnow()
+            self.created_at = utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
-            self.updated_at = datetime.utcnow()
+            self.updated_at = utcnow()
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """Equality
@@ -44,23 +75,58 @@ class Base():
             return False
         return (self.id == other.id)
 
+    def __setattr__(self, name: str, value):
+        """Set an attribute, dropping the cached serializations
+        """
+        self.__dict__.pop('_json_cache', None)
+        super().__setattr__(name, value)
+
+    def _serializations(self) -> dict:
+        """Serializations cached until the next attribute change
+        """
+        cache = self.__dict__.get('_json_cache')
+        if cache is None:
+            cache = self.__dict__['_json_cache'] = {}
+        return cache
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """Convert to JSON
         """
-        result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
-            else:
-                result[key] = value
-        return result
+        cache = self._serializations()
+        result = cache.get(for_serialization)
+        if result is None:
+            result = {}
+            for key, value in self.__dict__.items():
+                if key == '_json_cache':
+                    continue
+                if not for_serialization and key[0] == '_':
+                    continue
+                if type(value) is datetime:
+                    result[key] = format_timestamp(value)
+                else:
+                    result[key] = value
+            cache[for_serialization] = result
+        return dict(result)
+
+    def to_json_str(self, for_serialization: bool = False) -> str:
+        """Convert to a JSON document encoded like Flask's `jsonify`
+        """
+        cache = self._serializations()
+        key = ('str', for_serialization)
+        text = cache.get(key)
+        if text is None:
+            text = fast_json.dumps(self.to_json(for_serialization),
+                                   sort_keys=True)
+            cache[key] = text
+        return text
 
     @classmethod
     def load_from_file(cls):
         """Load all
         """
+        if SQLITE:
+            sqlite_store.load(cls)
+            return
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
         DATA[s_class] = {}
@@ -68,7 +134,7 @@ class Base():
             return
 
         with open(file_path, 'r') as f:
-            objs_json = json.load(f)
+            objs_json = fast_json.loads(f.read())
             for obj_id, obj_json in objs_json.items():
                 DATA[s_class][obj_id] = cls(**obj_json)
 
@@ -76,26 +142,34 @@ class Base():
     def save_to_file(cls):
         """Save all
         """
+        if SQLITE:
+            return
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        objs_json = ','.join(
+            '{}:{}'.format(fast_json.dumps(obj_id), obj.to_json_str(True))
+            for obj_id, obj in DATA[s_class].items())
 
         with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+            f.write('{' + objs_json + '}')
 
     def save(self):
         """Save current
         """
+        self.updated_at = utcnow()
+        if SQLITE:
+            sqlite_store.save(self)
+            return
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
         DATA[s_class][self.id] = self
         self.__class__.save_to_file()
 
     def remove(self):
         """Remove
         """
+        if SQLITE:
+            sqlite_store.remove(self)
+            return
         s_class = self.__class__.__name__
         if DATA[s_class].get(self.id) is not None:
             del DATA[s_class][self.id]
@@ -105,6 +179,8 @@ class Base():
     def count(cls) -> int:
         """Count all
         """
+        if SQLITE:
+            return sqlite_store.count(cls)
         s_class = cls.__name__
         return len(DATA[s_class].keys())
 
@@ -118,6 +194,8 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """Return one by id
         """
+        if SQLITE:
+            return sqlite_store.get(cls, id)
         s_class = cls.__name__
         return DATA[s_class].get(id)
 
@@ -125,6 +203,8 @@ class Base():
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """Search all
         """
+        if SQLITE:
+            return sqlite_store.search(cls, attributes)
         s_class = cls.__name__
         def _search(obj):
             if len(attributes) == 0:
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""SQLite storage module
+
+Stores each model class in its own table: the serialized object in a
+JSON `data` column plus one indexed column per attribute listed in the
+class `INDEXED_ATTRIBUTES`, so equality searches on them use an index.
+"""
+import sqlite3
+import threading
+from os import getenv, path
+from typing import List, TypeVar
+
+from models import fast_json
+
+
+DB_PATH = getenv('MODEL_SQLITE_PATH', '.db.sqlite3')
+_local = threading.local()
+_tables = set()
+_tables_lock = threading.Lock()
+
+
+def _connection() -> sqlite3.Connection:
+    """Connection of the current thread
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _local.conn = conn
+    return conn
+
+
+def _table(cls: type) -> str:
+    """Name of the table of a class, created on first use
+
+    A new table is seeded with the content of the class JSON file, if
+    any, to migrate from the JSON store.
+    """
+    name = cls.__name__
+    if name in _tables:
+        return name
+    with _tables_lock:
+        if name in _tables:
+            return name
+        conn = _connection()
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (name,)).fetchone()
+        with conn:
+            columns = ''.join(', "{}"'.format(attr)
+                              for attr in cls.INDEXED_ATTRIBUTES)
+            conn.execute('CREATE TABLE IF NOT EXISTS "{}" '
+                         '(id TEXT PRIMARY KEY, data TEXT NOT NULL{})'
+                         .format(name, columns))
+            for attr in cls.INDEXED_ATTRIBUTES:
+                conn.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}" '
+                             'ON "{0}" ("{1}")'.format(name, attr))
+        json_path = ".db_{}.json".format(name)
+        if not exists and path.exists(json_path):
+            with open(json_path, 'r') as f:
+                objs_json = fast_json.loads(f.read())
+            _insert(conn, cls, name, objs_json.values())
+        _tables.add(name)
+    return name
+
+
+def _insert(conn: sqlite3.Connection, cls: type, name: str, objs_json):
+    """Insert or replace serialized objects
+    """
+    attrs = ('id', 'data') + tuple(cls.INDEXED_ATTRIBUTES)
+    sql = 'INSERT OR REPLACE INTO "{}" ({}) VALUES ({})'.format(
+        name, ', '.join('"{}"'.format(a) for a in attrs),
+        ', '.join('?' * len(attrs)))
+    rows = [(obj_json['id'], fast_json.dumps(obj_json)) +
+            tuple(obj_json.get(a) for a in cls.INDEXED_ATTRIBUTES)
+            for obj_json in objs_json]
+    with conn:
+        conn.executemany(sql, rows)
+
+
+def load(cls: type):
+    """Make sure the table of a class exists
+    """
+    _table(cls)
+
+
+def save(obj) -> None:
+    """Insert or update one object
+    """
+    cls = obj.__class__
+    _insert(_connection(), cls, _table(cls), [obj.to_json(True)])
+
+
+def remove(obj) -> None:
+    """Delete one object
+    """
+    conn = _connection()
+    with conn:
+        conn.execute('DELETE FROM "{}" WHERE id = ?'.format(
+            _table(obj.__class__)), (obj.id,))
+
+
+def count(cls: type) -> int:
+    """Number of objects of a class
+    """
+    sql = 'SELECT COUNT(*) FROM "{}"'.format(_table(cls))
+    return _connection().execute(sql).fetchone()[0]
+
+
+def get(cls: type, id: str) -> TypeVar('Base'):
+    """Object of a class by id
+    """
+    sql = 'SELECT data FROM "{}" WHERE id = ?'.format(_table(cls))
+    row = _connection().execute(sql, (id,)).fetchone()
+    if row is None:
+        return None
+    return cls(**fast_json.loads(row[0]))
+
+
+def search(cls: type, attributes: dict) -> List[TypeVar('Base')]:
+    """Objects of a class matching every attribute
+
+    Indexed attributes are matched in SQL, the others on the loaded
+    objects.
+    """
+    clauses, params, others = [], [], {}
+    for key, value in attributes.items():
+        if key == 'id' or key in cls.INDEXED_ATTRIBUTES:
+            clauses.append('"{}" IS ?'.format(key))
+            params.append(value)
+        else:
+            others[key] = value
+    sql = 'SELECT data FROM "{}"'.format(_table(cls))
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    result = []
+    for row in _connection().execute(sql, params):
+        obj = cls(**fast_json.loads(row[0]))
+        if all(getattr(obj, k) == v for k, v in others.items()):
+            result.append(obj)
+    return result
@@ -2,35 +2,32 @@
 """API route module setup and configuration.
 """
 import os
+import time
 from os import getenv
-from flask import Flask, jsonify, abort, request
+from flask import Flask, jsonify, abort, request, g
 from flask_cors import CORS
 
+from api.v1 import metrics, profiling
+from api.v1.auth import load_auth
+from api.v1.json_provider import FastJSONProvider
 from api.v1.views import app_views
-from api.v1.auth.auth import Auth
-from api.v1.auth.basic_auth import BasicAuth
-from api.v1.auth.session_auth import SessionAuth
-from api.v1.auth.session_db_auth import SessionDBAuth
-from api.v1.auth.session_exp_auth import SessionExpAuth
+from models.base import SHARED, preload
 
 # Initialize Flask application
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 
 # Determine authentication method based on environment variable
-auth = None
 auth_type = getenv('AUTH_TYPE', 'auth')
-if auth_type == 'auth':
-    auth = Auth()
-elif auth_type == 'basic_auth':
-    auth = BasicAuth()
-elif auth_type == 'session_auth':
-    auth = SessionAuth()
-elif auth_type == 'session_exp_auth':
-    auth = SessionExpAuth()
-elif auth_type == 'session_db_auth':
-    auth = SessionDBAuth()
+auth = load_auth(auth_type)
+
+if SHARED:
+    # Load the store once in the pre-fork master (e.g. gunicorn --preload)
+    from models.user import User
+    from models.user_session import UserSession
+    preload(User, UserSession)
 
 @app.errorhandler(404)
 def not_found(error) -> str:
@@ -47,6 +44,21 @@ def forbidden(error) -> str:
     """Handles 403 Forbidden errors by returning a JSON response."""
     return jsonify({"error": "Forbidden"}), 403
 
+@app.errorhandler(429)
+def too_many_requests(error) -> str:
+    """Handles 429 Too Many Requests errors by returning a JSON response."""
+    return jsonify({"error": "Too many requests"}), 429
+
+@app.errorhandler(503)
+def service_unavailable(error) -> str:
+    """Handles 503 Service Unavailable errors by returning a JSON response."""
+    return jsonify({"error": "Service unavailable"}), 503
+
+@app.before_request
+def start_timer():
+    """Record when the request started."""
+    g.request_start = time.perf_counter()
+
 @app.before_request
 def authenticate_user():
     """Authenticate the user before processing the request."""
@@ -56,16 +68,32 @@ def authenticate_user():
             "/api/v1/unauthorized/",
             "/api/v1/forbidden/",
             "/api/v1/auth_session/login/",
+            "/api/v1/metrics/",
         ]
-        if auth.require_auth(request.path, excluded_paths):
+        with metrics.auth_phase(auth, 'require_auth'):
+            required = auth.require_auth(request.path, excluded_paths)
+        if required:
             if auth.authorization_header(request) is None and \
                     auth.session_cookie(request) is None:
                 abort(401)
-            user = auth.current_user(request)
+            with metrics.auth_phase(auth, 'current_user'), \
+                    profiling.sample(auth):
+                user = auth.current_user(request)
             if user is None:
                 abort(403)
             request.current_user = user
 
+@app.after_request
+def record_request_duration(response):
+    """Record the request latency under its route."""
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.REQUEST_DURATION.observe(
+            (request.method, route, str(response.status_code)),
+            time.perf_counter() - start)
+    return response
+
 if __name__ == "__main__":
     host = getenv("API_HOST", "0.0.0.0")
     port = getenv("API_PORT", "5000")
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Registry of the authentication providers selectable by AUTH_TYPE.
+"""
+from importlib import import_module
+from typing import Dict, Tuple
+
+AUTH_PROVIDERS: Dict[str, Tuple[str, str]] = {
+    'auth': ('api.v1.auth.auth', 'Auth'),
+    'basic_auth': ('api.v1.auth.basic_auth', 'BasicAuth'),
+    'session_auth': ('api.v1.auth.session_auth', 'SessionAuth'),
+    'session_exp_auth': ('api.v1.auth.session_exp_auth', 'SessionExpAuth'),
+    'session_db_auth': ('api.v1.auth.session_db_auth', 'SessionDBAuth'),
+    'session_signed_auth': ('api.v1.auth.session_signed_auth',
+                            'SessionSignedAuth'),
+}
+
+
+def load_auth(auth_type: str):
+    """
+    Import and instantiate the provider registered for an AUTH_TYPE.
+
+    Only the module of the selected provider (and its parents) is
+    imported.
+
+    Args:
+        auth_type (str): The AUTH_TYPE value.
+
+    Returns:
+        Auth: A new provider instance, or None if the type is unknown.
+    """
+    provider = AUTH_PROVIDERS.get(auth_type)
+    if provider is None:
+        return None
+    module_name, class_name = provider
+    return getattr(import_module(module_name), class_name)()
@@ -1,14 +1,104 @@
 #!/usr/bin/env python3
 """Authentication module for managing user access.
 """
+import functools
 import os
 import re
-from typing import List, TypeVar
+from threading import Lock
+from typing import Callable, List, TypeVar
 from flask import request
 
+
+class _Flight:
+    """A lookup in progress, whose outcome is shared by its waiters.
+    """
+    __slots__ = ('running', 'result', 'error')
+
+    def __init__(self) -> None:
+        """Initialize a flight that has not landed yet.
+
+        `running` is held until the result is known; a plain lock is much
+        cheaper to create than an Event.
+        """
+        self.running = Lock()
+        self.running.acquire()
+        self.result = None
+        self.error = None
+
+
+def single_flight(method: Callable) -> Callable:
+    """
+    Coalesce concurrent calls of an Auth method with the same arguments.
+
+    The first caller runs the method; callers arriving while it runs wait
+    for it and get the same result, or exception, instead of repeating
+    the work.
+
+    Args:
+        method (Callable): The method to wrap; its arguments must be
+            hashable for calls to be coalesced.
+
+    Returns:
+        Callable: The wrapped method.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.coalesce_lookups:
+            return method(self, *args, **kwargs)
+        key = (method.__qualname__, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return method(self, *args, **kwargs)
+        return self._coalesce(key, method, self, *args, **kwargs)
+    return wrapper
+
+
 class Auth:
     """Class for handling user authentication.
     """
+    # Share one in-flight computation between concurrent identical lookups
+    coalesce_lookups = True
+
+    def __init__(self) -> None:
+        """Initialize the table of in-flight lookups.
+        """
+        self._flights = {}
+        self._flights_lock = Lock()
+
+    def _coalesce(self, key: tuple, func: Callable, *args, **kwargs):
+        """
+        Run `func` unless a call with the same key is already running.
+
+        Args:
+            key (tuple): Identifies identical calls.
+            func (Callable): The computation.
+
+        Returns:
+            The result of the computation, shared by every caller.
+        """
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            with flight.running:
+                pass
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = func(*args, **kwargs)
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.running.release()
+        return flight.result
+
     def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
         """
         Determine if a given path requires authentication.
@@ -59,6 +149,18 @@ class Auth:
         """
         return None
 
+    def destroy_all_sessions(self, user_id: str) -> int:
+        """
+        Revoke every session of a user.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            int: The number of sessions revoked; always 0 without sessions.
+        """
+        return 0
+
     def session_cookie(self, request=None) -> str:
         """
         Retrieve the session cookie from the request.
@@ -6,7 +6,11 @@ import base64
 import binascii
 from typing import Tuple, TypeVar
 
-from .auth import Auth
+from flask import abort
+
+from .auth import Auth, single_flight
+from api.v1.metrics import auth_phase
+from api.v1.throttle import LOGIN_THROTTLE
 from models.user import User
 
 
@@ -67,6 +71,7 @@ class BasicAuth(Auth):
                 return user, password
         return None, None
 
+    @single_flight
     def user_object_from_credentials(self, user_email: str, user_pwd: str) -> TypeVar('User'):
         """
         Retrieve the user object using email and password.
@@ -80,7 +85,8 @@ class BasicAuth(Auth):
         """
         if isinstance(user_email, str) and isinstance(user_pwd, str):
             try:
-                users = User.search({'email': user_email})
+                with auth_phase(self, 'storage'):
+                    users = User.search({'email': user_email})
             except Exception:
                 return None
             if not users:
@@ -98,10 +104,22 @@ class BasicAuth(Auth):
             
         Returns:
             TypeVar('User'): The authenticated User object, or None if authentication fails.
+
+        Raises:
+            HTTPException: 429 if too many attempts failed for this client
+                or email.
         """
         auth_header = self.authorization_header(request)
         b64_auth_token = self.extract_base64_authorization_header(auth_header)
         auth_token = self.decode_base64_authorization_header(b64_auth_token)
         email, password = self.extract_user_credentials(auth_token)
-        return self.user_object_from_credentials(email, password)
+        if email is None:
+            return None
+        ip = request.remote_addr if request is not None else None
+        status = LOGIN_THROTTLE.limit(ip, email)
+        if status is not None:
+            abort(status)
+        user = self.user_object_from_credentials(email, password)
+        LOGIN_THROTTLE.record(ip, email, user is not None)
+        return user
 
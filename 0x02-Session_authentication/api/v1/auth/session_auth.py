@@ -1,16 +1,36 @@
 #!/usr/bin/env python3
 """Session management for authentication.
 """
+import os
+import threading
 from uuid import uuid4
 from flask import request
 
 from .auth import Auth
+from api.v1.metrics import auth_phase
 from models.user import User
 
 class SessionAuth(Auth):
     """Session management class for user authentication.
+
+    Besides the session to user map, a reverse map holds the sessions of
+    each user, oldest first, so that all of them can be revoked at once
+    and their number capped by SESSION_MAX_PER_USER (0, the default,
+    means no cap).
     """
     user_id_by_session_id = {}
+    session_ids_by_user_id = {}
+    _sessions_lock = threading.RLock()
+
+    def __init__(self) -> None:
+        """Initialize the per-user session cap.
+        """
+        super().__init__()
+        try:
+            self.max_sessions_per_user = int(
+                os.getenv('SESSION_MAX_PER_USER', '0'))
+        except ValueError:
+            self.max_sessions_per_user = 0
 
     def create_session(self, user_id: str = None) -> str:
         """
@@ -24,10 +44,55 @@ class SessionAuth(Auth):
         """
         if isinstance(user_id, str):
             session_id = str(uuid4())
-            self.user_id_by_session_id[session_id] = user_id
+            with self._sessions_lock:
+                self.user_id_by_session_id[session_id] = user_id
+                sessions = self.session_ids_by_user_id.setdefault(user_id, {})
+                sessions[session_id] = None
+                if self.max_sessions_per_user > 0:
+                    while len(sessions) > self.max_sessions_per_user:
+                        self._forget_session(next(iter(sessions)))
             return session_id
         return None
 
+    def _forget_session(self, session_id: str) -> bool:
+        """
+        Remove a session from the in-memory maps.
+
+        Args:
+            session_id (str): The session ID to remove.
+
+        Returns:
+            bool: True if the session was known, False otherwise.
+        """
+        with self._sessions_lock:
+            entry = self.user_id_by_session_id.pop(session_id, None)
+            if entry is None:
+                return False
+            user_id = entry.get('user_id') if isinstance(entry, dict) \
+                else entry
+            sessions = self.session_ids_by_user_id.get(user_id)
+            if sessions is not None:
+                sessions.pop(session_id, None)
+                if not sessions:
+                    del self.session_ids_by_user_id[user_id]
+            return True
+
+    def destroy_all_sessions(self, user_id: str) -> int:
+        """
+        Revoke every session of a user, in time proportional to their number.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            int: The number of sessions revoked.
+        """
+        with self._sessions_lock:
+            sessions = self.session_ids_by_user_id.pop(user_id, {})
+            for session_id in sessions:
+                self.user_id_by_session_id.pop(session_id, None)
+        return len(sessions)
+
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """
         Retrieve the user ID associated with a given session ID.
@@ -55,7 +120,8 @@ class SessionAuth(Auth):
         session_id = self.session_cookie(request)
         user_id = self.user_id_for_session_id(session_id)
         if user_id:
-            return User.get(user_id)
+            with auth_phase(self, 'storage'):
+                return User.get(user_id)
         return None
 
     def destroy_session(self, request=None) -> bool:
@@ -71,8 +137,5 @@ class SessionAuth(Auth):
         session_id = self.session_cookie(request)
         if request is None or session_id is None:
             return False
-        if session_id in self.user_id_by_session_id:
-            del self.user_id_by_session_id[session_id]
-            return True
-        return False
+        return self._forget_session(session_id)
 
@@ -1,16 +1,50 @@
 #!/usr/bin/env python3
 """Session management with database persistence.
 """
+import atexit
+import os
+import threading
+import time
 from flask import request
 from datetime import datetime, timedelta
 
+from api.v1.metrics import auth_phase
+from models.base import utcnow
 from models.user_session import UserSession
+from .auth import single_flight
 from .session_exp_auth import SessionExpAuth
 
 class SessionDBAuth(SessionExpAuth):
     """Session authentication class with database storage.
+
+    In sliding mode, the last use of a session is tracked in memory and
+    only persisted, as UserSession.last_seen, once it has advanced by
+    SESSION_LAST_SEEN_GRANULARITY seconds (60 by default). Those updates
+    are written in batches, at most every
+    SESSION_LAST_SEEN_FLUSH_INTERVAL seconds (5 by default) and at exit,
+    so that persistence I/O is bounded by the number of active sessions
+    rather than by the request rate. A session may thus expire up to the
+    granularity early.
     """
 
+    def __init__(self) -> None:
+        """Initialize the batching of last-seen updates.
+        """
+        super().__init__()
+        try:
+            self.last_seen_granularity = float(
+                os.getenv('SESSION_LAST_SEEN_GRANULARITY', '60'))
+            self.last_seen_flush_interval = float(
+                os.getenv('SESSION_LAST_SEEN_FLUSH_INTERVAL', '5'))
+        except ValueError:
+            self.last_seen_granularity = 60.0
+            self.last_seen_flush_interval = 5.0
+        self._pending_last_seen = {}
+        self._pending_lock = threading.Lock()
+        self._next_flush = time.monotonic() + self.last_seen_flush_interval
+        if self.sliding:
+            atexit.register(self.flush_last_seen)
+
     def create_session(self, user_id=None) -> str:
         """
         Create and store a new session ID in the database.
@@ -25,9 +59,57 @@ class SessionDBAuth(SessionExpAuth):
         if isinstance(session_id, str):
             user_session = UserSession(user_id=user_id, session_id=session_id)
             user_session.save()
+            if self.max_sessions_per_user > 0:
+                self._evict_oldest_sessions(user_id, session_id)
             return session_id
         return None
 
+    def _evict_oldest_sessions(self, user_id: str, newest: str) -> None:
+        """
+        Remove the oldest stored sessions of a user beyond the cap.
+
+        Args:
+            user_id (str): The ID of the user.
+            newest (str): The session just created, which is kept.
+        """
+        with auth_phase(self, 'storage'):
+            sessions = UserSession.search({'user_id': user_id})
+        excess = len(sessions) - self.max_sessions_per_user
+        if excess <= 0:
+            return
+        others = sorted((s for s in sessions if s.session_id != newest),
+                        key=lambda s: s.created_at)
+        for session in others[:excess]:
+            self._forget_session(session.session_id)
+            with self._pending_lock:
+                self._pending_last_seen.pop(session.session_id, None)
+            session.remove()
+
+    def destroy_all_sessions(self, user_id: str) -> int:
+        """
+        Revoke every stored session of a user.
+
+        The user_id index of UserSession makes this proportional to the
+        number of sessions of the user.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            int: The number of sessions revoked.
+        """
+        super().destroy_all_sessions(user_id)
+        if not isinstance(user_id, str):
+            return 0
+        with auth_phase(self, 'storage'):
+            sessions = UserSession.search({'user_id': user_id})
+        for session in sessions:
+            with self._pending_lock:
+                self._pending_last_seen.pop(session.session_id, None)
+            session.remove()
+        return len(sessions)
+
+    @single_flight
     def user_id_for_session_id(self, session_id=None):
         """
         Retrieve the user ID associated with a given session ID from the database.
@@ -42,7 +124,8 @@ class SessionDBAuth(SessionExpAuth):
             return None
 
         try:
-            sessions = UserSession.search({'session_id': session_id})
+            with auth_phase(self, 'storage'):
+                sessions = UserSession.search({'session_id': session_id})
         except Exception:
             return None
         
@@ -50,6 +133,8 @@ class SessionDBAuth(SessionExpAuth):
             return None
 
         session = sessions[0]
+        if self.sliding:
+            return self._touch(session)
         cur_time = datetime.now()
         exp_time = session.created_at + timedelta(seconds=self.session_duration)
         if exp_time < cur_time:
@@ -57,6 +142,50 @@ class SessionDBAuth(SessionExpAuth):
 
         return session.user_id
 
+    def _touch(self, session: UserSession) -> str:
+        """
+        Check the sliding expiry of a session and record its use.
+
+        Args:
+            session (UserSession): The stored session.
+
+        Returns:
+            str: The user ID of the session, or None if it has expired.
+        """
+        now = utcnow()
+        persisted = session.last_seen or session.created_at
+        pending = self._pending_last_seen.get(session.session_id)
+        last_seen = pending[1] if pending is not None else persisted
+        if self.session_duration > 0 and \
+                last_seen + timedelta(seconds=self.session_duration) < now:
+            return None
+        if (now - persisted).total_seconds() >= self.last_seen_granularity:
+            with self._pending_lock:
+                self._pending_last_seen[session.session_id] = (session, now)
+        if self._pending_last_seen and time.monotonic() >= self._next_flush:
+            self.flush_last_seen()
+        return session.user_id
+
+    def flush_last_seen(self) -> int:
+        """
+        Persist the pending last-seen updates in a single batch.
+
+        Returns:
+            int: The number of sessions written.
+        """
+        with self._pending_lock:
+            pending = self._pending_last_seen
+            self._pending_last_seen = {}
+            self._next_flush = time.monotonic() + \
+                self.last_seen_flush_interval
+        sessions = []
+        for session, last_seen in pending.values():
+            session.last_seen = last_seen
+            sessions.append(session)
+        # Sessions destroyed in the meantime are not brought back
+        with auth_phase(self, 'storage'):
+            return UserSession.save_many(sessions, stored_only=True)
+
     def destroy_session(self, request=None) -> bool:
         """
         Destroy the session associated with the request.
@@ -80,6 +209,9 @@ class SessionDBAuth(SessionExpAuth):
             return False
 
         session = sessions[0]
+        with self._pending_lock:
+            self._pending_last_seen.pop(session_id, None)
         session.remove()
+        self._forget_session(session_id)
         return True
 
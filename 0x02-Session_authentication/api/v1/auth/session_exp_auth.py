@@ -9,6 +9,9 @@ from .session_auth import SessionAuth
 
 class SessionExpAuth(SessionAuth):
     """Session management class with expiration handling.
+
+    Sessions expire SESSION_DURATION seconds after their creation or,
+    with SESSION_SLIDING=1, after their last use.
     """
 
     def __init__(self) -> None:
@@ -19,6 +22,7 @@ class SessionExpAuth(SessionAuth):
             self.session_duration = int(os.getenv('SESSION_DURATION', '0'))
         except ValueError:
             self.session_duration = 0
+        self.sliding = os.getenv('SESSION_SLIDING', '0') == '1'
 
     def create_session(self, user_id=None) -> str:
         """
@@ -33,10 +37,13 @@ class SessionExpAuth(SessionAuth):
         session_id = super().create_session(user_id)
         if not isinstance(session_id, str):
             return None
-        self.user_id_by_session_id[session_id] = {
-            'user_id': user_id,
-            'created_at': datetime.now(),
-        }
+        with self._sessions_lock:
+            # Unless already evicted by the per-user cap
+            if session_id in self.user_id_by_session_id:
+                self.user_id_by_session_id[session_id] = {
+                    'user_id': user_id,
+                    'created_at': datetime.now(),
+                }
         return session_id
 
     def user_id_for_session_id(self, session_id=None) -> str:
@@ -60,10 +67,13 @@ class SessionExpAuth(SessionAuth):
             return None
 
         current_time = datetime.now()
-        expiration_time = session_info['created_at'] + timedelta(seconds=self.session_duration)
+        start = session_info.get('last_seen', session_info['created_at'])
+        expiration_time = start + timedelta(seconds=self.session_duration)
         
         if current_time > expiration_time:
             return None
 
+        if self.sliding:
+            session_info['last_seen'] = current_time
         return session_info['user_id']
 
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Stateless session management with HMAC-signed tokens.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+from .session_exp_auth import SessionExpAuth
+from models import base
+
+
+class SessionSignedAuth(SessionExpAuth):
+    """Session authentication class whose session ID is a signed token.
+
+    The token carries the user ID and the expiry time, so it is checked
+    with an HMAC and no storage lookup. Signing keys come from
+    SESSION_SIGNING_KEYS as comma-separated `key_id:secret` pairs: the
+    first one signs new tokens, all of them verify, which allows keys to
+    be rotated; every worker process must be given the same keys.
+    Destroyed sessions are kept in a revocation set until they expire,
+    expired entries being pruned as the set grows. Revoking all the
+    sessions of a user records the time, in milliseconds, before which
+    that user's tokens are rejected. Beyond SESSION_MAX_REVOKED entries,
+    which tokens that never expire can reach, the oldest revocations are
+    turned into revocations of every session their user opened until
+    then. Being stateless, these sessions are not subject to
+    SESSION_MAX_PER_USER.
+
+    Revocations are kept in the memory of the process: a logout handled
+    by one worker process would not reach the others. This provider
+    must therefore run in a single process, with any number of threads,
+    and refuses to start with MODEL_STORE_SHARED=1, the pre-fork mode.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the signing keys and the revocation set.
+
+        Raises:
+            ValueError: If the model store is shared by worker processes,
+            which would not see each other's revocations.
+        """
+        if base.SHARED:
+            raise ValueError('session_signed_auth keeps revocations in '
+                             'memory and cannot run with '
+                             'MODEL_STORE_SHARED=1')
+        super().__init__()
+        self.keys = self._keys_from_env()
+        self.signing_key_id = next(iter(self.keys))
+        # Expiry, user ID and issue time of the revoked tokens
+        self.revoked: Dict[str, Tuple[int, str, int]] = {}
+        self.max_revoked = int(os.getenv('SESSION_MAX_REVOKED', '65536'))
+        self.prune_revoked_at = min(1024, self.max_revoked)
+        self.revoked_users: Dict[str, int] = {}
+        self._revoke_lock = threading.Lock()
+
+    @staticmethod
+    def _keys_from_env() -> Dict[str, bytes]:
+        """
+        Parse SESSION_SIGNING_KEYS.
+
+        Returns:
+            Dict[str, bytes]: The secrets by key ID, signing key first.
+
+        Raises:
+            ValueError: If no key is configured. A key generated by each
+            process would make its tokens invalid in all the others.
+        """
+        keys = {}
+        for pair in os.getenv('SESSION_SIGNING_KEYS', '').split(','):
+            key_id, _, secret = pair.strip().partition(':')
+            if key_id and secret:
+                keys[key_id] = secret.encode()
+        if not keys:
+            raise ValueError('SESSION_SIGNING_KEYS must hold at least one '
+                             'key_id:secret pair')
+        return keys
+
+    def _sign(self, key_id: str, payload: bytes) -> bytes:
+        """
+        Compute the signature of a token payload.
+
+        Args:
+            key_id (str): The ID of the key to sign with.
+            payload (bytes): The encoded payload.
+
+        Returns:
+            bytes: The URL-safe base64 signature.
+        """
+        digest = hmac.new(self.keys[key_id], payload, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=')
+
+    def create_session(self, user_id: str = None) -> str:
+        """
+        Create a signed session token for a user.
+
+        Args:
+            user_id (str): The ID of the user for whom the session is created.
+
+        Returns:
+            str: The session token.
+        """
+        if not isinstance(user_id, str):
+            return None
+        expires = 0
+        if self.session_duration > 0:
+            expires = int(time.time()) + self.session_duration
+        issued = int(time.time() * 1000)
+        nonce = base64.urlsafe_b64encode(os.urandom(9)).decode()
+        raw = '{}:{}:{}:{}:{}'.format(self.signing_key_id, user_id, issued,
+                                      expires, nonce)
+        payload = base64.urlsafe_b64encode(raw.encode()).rstrip(b'=')
+        signature = self._sign(self.signing_key_id, payload)
+        return '{}.{}'.format(payload.decode(), signature.decode())
+
+    def _verify(self, session_id: str) -> Tuple[str, int, int]:
+        """
+        Check the signature and expiry of a session token.
+
+        Args:
+            session_id (str): The session token.
+
+        Returns:
+            Tuple[str, int, int]: The user ID, issue time and expiry time,
+            or (None, 0, 0) if the token is malformed, forged, expired or
+            revoked, alone or with all the sessions of its user.
+        """
+        if not isinstance(session_id, str) or session_id in self.revoked:
+            return None, 0, 0
+        payload, _, signature = session_id.partition('.')
+        try:
+            raw = base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4))
+            key_id, user_id, issued, expires, _ = raw.decode().split(':')
+            issued, expires = int(issued), int(expires)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None, 0, 0
+        if key_id not in self.keys or not hmac.compare_digest(
+                signature.encode(), self._sign(key_id, payload.encode())):
+            return None, 0, 0
+        if expires and expires < time.time():
+            return None, 0, 0
+        if issued <= self.revoked_users.get(user_id, -1):
+            return None, 0, 0
+        return user_id, issued, expires
+
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """
+        Retrieve the user ID carried by a valid session token.
+
+        Args:
+            session_id (str): The session token.
+
+        Returns:
+            str: The user ID, or None if the token is not valid.
+        """
+        return self._verify(session_id)[0]
+
+    def destroy_session(self, request=None) -> bool:
+        """
+        Revoke the session token of the request.
+
+        Args:
+            request (flask.Request, optional): The request object
+                containing the session cookie.
+
+        Returns:
+            bool: True if a valid session was revoked, False otherwise.
+        """
+        session_id = self.session_cookie(request)
+        user_id, issued, expires = self._verify(session_id)
+        if user_id is None:
+            return False
+        with self._revoke_lock:
+            if len(self.revoked) >= self.prune_revoked_at:
+                self._prune_revoked()
+            self.revoked[session_id] = (expires, user_id, issued)
+        return True
+
+    def _prune_revoked(self) -> None:
+        """
+        Drop the revocations of expired tokens, then fold the oldest ones
+        into revocations by user until at most half of SESSION_MAX_REVOKED
+        remain. The revocation lock must be held.
+        """
+        now = time.time()
+        revoked = {token: entry for token, entry in self.revoked.items()
+                   if not entry[0] or entry[0] >= now}
+        excess = len(revoked) - self.max_revoked // 2
+        if excess > 0:
+            for token in list(revoked)[:excess]:
+                _, user_id, issued = revoked.pop(token)
+                if issued > self.revoked_users.get(user_id, -1):
+                    self.revoked_users[user_id] = issued
+        self.revoked = revoked
+        self.prune_revoked_at = min(self.max_revoked,
+                                    max(1024, 2 * len(revoked)))
+
+    def destroy_all_sessions(self, user_id: str) -> int:
+        """
+        Reject every token issued so far to a user.
+
+        Entries are dropped once the tokens they reject have expired.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            int: Always 0, as the tokens of a user are not tracked.
+        """
+        if not isinstance(user_id, str):
+            return 0
+        now = int(time.time() * 1000)
+        with self._revoke_lock:
+            if self.session_duration > 0:
+                horizon = now - self.session_duration * 1000
+                self.revoked_users = {user: revoked_at for user, revoked_at
+                                      in self.revoked_users.items()
+                                      if revoked_at >= horizon}
+            self.revoked_users[user_id] = now
+        return 0
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""JSON provider module for the Flask app.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+from models import fast_json
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider encoding responses through `models.fast_json`.
+
+    Compact responses, the default outside debug mode, take the fast
+    path and are byte-identical to the default provider's; any other
+    formatting is left to the default provider.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        """
+        Serialize data as JSON.
+
+        Args:
+            obj: The data to serialize.
+            **kwargs: Arguments forwarded to `json.dumps`.
+
+        Returns:
+            str: The JSON document.
+        """
+        if kwargs.keys() <= {'separators'} and self.ensure_ascii and \
+                kwargs.get('separators', (',', ':')) == (',', ':'):
+            return fast_json.dumps(obj, sort_keys=self.sort_keys,
+                                   default=self.default)
+        return super().dumps(obj, **kwargs)
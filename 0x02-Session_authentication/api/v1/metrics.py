@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Latency histograms, memory and model cache metrics exposed in the
+Prometheus text format.
+"""
+import os
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, List, Tuple
+
+from models.base import DATA
+from models.cache import ModelCache
+
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Cumulative latency histogram keyed by a tuple of label values.
+    """
+
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...]):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            name (str): The metric name.
+            doc (str): The help text of the metric.
+            labels (Tuple[str, ...]): The label names.
+        """
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = Lock()
+
+    def observe(self, values: Tuple[str, ...], seconds: float) -> None:
+        """
+        Record one observation.
+
+        Args:
+            values (Tuple[str, ...]): The label values, in label order.
+            seconds (float): The observed duration.
+        """
+        index = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * (len(BUCKETS) + 1),
+                                                 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    def render(self) -> List[str]:
+        """
+        Render the histogram in the text exposition format.
+
+        Returns:
+            List[str]: The exposition lines.
+        """
+        lines = ['# HELP {} {}'.format(self.name, self.doc),
+                 '# TYPE {} histogram'.format(self.name)]
+        with self._lock:
+            series = [(values, list(counts), total)
+                      for values, (counts, total) in self._series.items()]
+        for values, counts, total in sorted(series):
+            labels = ','.join('{}="{}"'.format(k, v)
+                              for k, v in zip(self.labels, values))
+            prefix = labels + ',' if labels else ''
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append('{}_bucket{{{}le="{}"}} {}'.format(
+                    self.name, prefix, bound, cumulative))
+            lines.append('{}_sum{{{}}} {}'.format(self.name, labels, total))
+            lines.append('{}_count{{{}}} {}'.format(
+                self.name, labels, cumulative))
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    'api_request_duration_seconds',
+    'Time spent handling a request.',
+    ('method', 'route', 'status'))
+AUTH_PHASE_DURATION = Histogram(
+    'api_auth_phase_duration_seconds',
+    'Time spent in each phase of request authentication.',
+    ('auth', 'phase'))
+
+
+class auth_phase:
+    """Context manager timing a block as one authentication phase.
+    """
+    __slots__ = ('_values', '_start')
+
+    def __init__(self, auth: object, phase: str):
+        """
+        Args:
+            auth (object): The auth instance doing the work.
+            phase (str): The phase name (require_auth, current_user,
+                storage).
+        """
+        self._values = (type(auth).__name__, phase)
+
+    def __enter__(self) -> None:
+        """Start the timer."""
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        """Record the elapsed time."""
+        AUTH_PHASE_DURATION.observe(self._values,
+                                    time.perf_counter() - self._start)
+
+
+MODEL_CACHE_METRICS = (
+    ('hits_total', 'hits', 'counter', 'Lookups served from memory.'),
+    ('misses_total', 'misses', 'counter',
+     'Lookups faulting an object in from disk.'),
+    ('evictions_total', 'evictions', 'counter',
+     'Clean objects dropped from memory.'),
+    ('resident_objects', 'resident', 'gauge',
+     'Clean objects held in memory.'),
+    ('pinned_objects', 'pinned', 'gauge',
+     'Objects held in memory until the next snapshot.'))
+
+
+def resident_memory_bytes() -> int:
+    """
+    Measure the resident set size of the process.
+
+    Returns:
+        int: The RSS in bytes, or 0 where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return 0
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def render_model_caches() -> List[str]:
+    """
+    Render the RSS and the counters of the bounded model caches.
+
+    Returns:
+        List[str]: The exposition lines.
+    """
+    lines = ['# HELP process_resident_memory_bytes Resident memory size.',
+             '# TYPE process_resident_memory_bytes gauge',
+             'process_resident_memory_bytes {}'.format(
+                 resident_memory_bytes())]
+    caches = sorted((s_class, objs.stats()) for s_class, objs
+                    in list(DATA.items()) if isinstance(objs, ModelCache))
+    for name, key, kind, doc in MODEL_CACHE_METRICS:
+        lines.append('# HELP model_cache_{} {}'.format(name, doc))
+        lines.append('# TYPE model_cache_{} {}'.format(name, kind))
+        for s_class, stats in caches:
+            lines.append('model_cache_{}{{model="{}"}} {}'.format(
+                name, s_class, stats[key]))
+    return lines
+
+
+def render() -> str:
+    """
+    Render every metric in the text exposition format.
+
+    Returns:
+        str: The exposition document.
+    """
+    lines = REQUEST_DURATION.render() + AUTH_PHASE_DURATION.render() + \
+        render_model_caches()
+    return '\n'.join(lines) + '\n'
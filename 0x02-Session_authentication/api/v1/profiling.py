@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Sampling profiler for the authentication pipeline.
+
+A fraction of the requests, set by the PROFILE_RATE environment
+variable (0 disables profiling) or at runtime through
+`/api/v1/profiling`, have `Auth.current_user` traced. Time spent per call
+stack is aggregated per auth class and dumped to PROFILE_DIR in the
+collapsed stack format read by flamegraph.pl and speedscope.
+"""
+import atexit
+import os
+import random
+import sys
+import time
+from threading import Lock
+from typing import Dict, List
+
+
+def _rate_from_env() -> float:
+    """Read the sampling rate from the environment."""
+    try:
+        return min(max(float(os.getenv('PROFILE_RATE', '0')), 0.0), 1.0)
+    except ValueError:
+        return 0.0
+
+
+rate = _rate_from_env()
+profile_dir = os.getenv('PROFILE_DIR', 'profiles')
+_stacks: Dict[str, Dict[str, float]] = {}
+_lock = Lock()
+
+
+def set_rate(value: float) -> None:
+    """
+    Change the sampling rate.
+
+    Args:
+        value (float): The fraction of requests to profile, in [0, 1].
+    """
+    global rate
+    rate = min(max(value, 0.0), 1.0)
+
+
+def _label(frame, event: str, arg) -> str:
+    """Name a Python frame or a C function for a stack."""
+    if event.startswith('c_'):
+        module = getattr(arg, '__module__', None) or 'builtins'
+        return '{}:{}'.format(module,
+                              getattr(arg, '__qualname__', repr(arg)))
+    code = frame.f_code
+    return '{}:{}'.format(os.path.basename(code.co_filename), code.co_name)
+
+
+class _Tracer:
+    """Accumulates self time per call stack of the current thread.
+    """
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root (str): The label of the bottom stack frame.
+        """
+        self.root = root
+        self.stack: List[list] = []
+        self.samples: Dict[str, float] = {}
+
+    def __call__(self, frame, event: str, arg) -> None:
+        """Profile hook installed with `sys.setprofile`."""
+        now = time.perf_counter()
+        if event in ('call', 'c_call'):
+            self.stack.append([_label(frame, event, arg), now, 0.0])
+        elif self.stack:
+            label, start, children = self.stack.pop()
+            total = now - start
+            path = ';'.join([self.root] + [entry[0] for entry in self.stack]
+                            + [label])
+            self.samples[path] = self.samples.get(path, 0.0) + \
+                total - children
+            if self.stack:
+                self.stack[-1][2] += total
+
+
+class sample:
+    """Context manager profiling a block for a sampled request.
+    """
+    __slots__ = ('_name', '_tracer', '_previous')
+
+    def __init__(self, auth: object):
+        """
+        Args:
+            auth (object): The auth instance whose work is profiled.
+        """
+        self._name = type(auth).__name__
+        self._tracer = None
+
+    def __enter__(self) -> None:
+        """Start tracing if this request is sampled."""
+        if rate > 0 and random.random() < rate:
+            self._tracer = _Tracer(self._name)
+            self._previous = sys.getprofile()
+            sys.setprofile(self._tracer)
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop tracing and merge the collected stacks."""
+        if self._tracer is None:
+            return
+        sys.setprofile(self._previous)
+        with _lock:
+            stacks = _stacks.setdefault(self._name, {})
+            for path, seconds in self._tracer.samples.items():
+                stacks[path] = stacks.get(path, 0.0) + seconds
+
+
+def dump() -> List[str]:
+    """
+    Write the collapsed stacks of every auth class to PROFILE_DIR.
+
+    Returns:
+        List[str]: The paths of the written files.
+    """
+    with _lock:
+        snapshot = {name: dict(stacks) for name, stacks in _stacks.items()}
+    paths = []
+    for name, stacks in snapshot.items():
+        os.makedirs(profile_dir, exist_ok=True)
+        file_path = os.path.join(profile_dir, '{}.collapsed'.format(name))
+        with open(file_path, 'w') as f:
+            for path, seconds in sorted(stacks.items()):
+                micros = int(seconds * 1000000)
+                if micros > 0:
+                    f.write('{} {}\n'.format(path, micros))
+        paths.append(file_path)
+    return paths
+
+
+atexit.register(dump)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Brute-force throttling and admission control for password checks.
+
+Failed password checks drain a token bucket per client IP and one per
+email, whichever clients sent them; while either bucket is empty,
+further attempts are rejected with 429 before any password is hashed.
+So that an attacker cannot lock a victim out by failing logins for
+their email, a client that already authenticated as an email (the same
+IP and email) is exempt from the bucket of that email. Independently,
+at most LOGIN_MAX_PENDING logins may check their password at once:
+beyond that, logins are shed with 503 instead of queueing on the CPU.
+Basic Auth requests are only throttled, never shed.
+"""
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, Optional
+
+
+def _env_number(name: str, default: float) -> float:
+    """Read a positive number from the environment."""
+    try:
+        value = float(os.getenv(name, default))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+class TokenBuckets:
+    """Token buckets keyed by client, kept in a bounded LRU.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        """
+        Args:
+            rate (float): Tokens refilled per second.
+            burst (float): Capacity of each bucket.
+            max_keys (int): Number of buckets kept; the least recently
+                used ones are forgotten first.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def _refill(self, key: Hashable, now: float) -> list:
+        """Return the refilled bucket of a key, or None if it is full.
+
+        The caller must hold the throttle lock.
+        """
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return None
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] >= self.burst:
+            del self._buckets[key]
+            return None
+        self._buckets.move_to_end(key)
+        return bucket
+
+    def has_token(self, key: Hashable, now: float) -> bool:
+        """Tell whether a key may make an attempt."""
+        bucket = self._refill(key, now)
+        return bucket is None or bucket[0] >= 1
+
+    def take(self, key: Hashable, now: float) -> None:
+        """Consume one token of a key."""
+        bucket = self._refill(key, now)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+        bucket[0] = max(0.0, bucket[0] - 1)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class LoginThrottle:
+    """Guards password checks against brute force and overload.
+    """
+
+    def __init__(self):
+        """Configure the throttle from the environment."""
+        max_keys = int(_env_number('LOGIN_THROTTLE_MAX_KEYS', 100000))
+        self.by_ip = TokenBuckets(
+            _env_number('LOGIN_FAILURES_PER_IP_RATE', 1.0),
+            _env_number('LOGIN_FAILURES_PER_IP_BURST', 20), max_keys)
+        self.by_email = TokenBuckets(
+            _env_number('LOGIN_FAILURES_PER_EMAIL_RATE', 0.1),
+            _env_number('LOGIN_FAILURES_PER_EMAIL_BURST', 5), max_keys)
+        self.max_keys = max_keys
+        self.trusted = OrderedDict()
+        self.max_pending = int(_env_number('LOGIN_MAX_PENDING', 64))
+        self.pending = 0
+        self._lock = Lock()
+
+    def _throttled(self, ip: str, email: str, now: float) -> bool:
+        """Tell whether an attempt must be rejected with 429.
+
+        The caller must hold the throttle lock.
+        """
+        if not self.by_ip.has_token(ip, now):
+            return True
+        return (ip, email) not in self.trusted and \
+            not self.by_email.has_token(email, now)
+
+    def _record(self, ip: str, email: str, success: bool,
+                now: float) -> None:
+        """Drain the buckets on failure, trust the client on success.
+
+        The caller must hold the throttle lock.
+        """
+        if success:
+            self.trusted[(ip, email)] = True
+            self.trusted.move_to_end((ip, email))
+            while len(self.trusted) > self.max_keys:
+                self.trusted.popitem(last=False)
+        else:
+            self.by_ip.take(ip, now)
+            self.by_email.take(email, now)
+
+    def limit(self, ip: str, email: str) -> Optional[int]:
+        """
+        Decide whether a Basic Auth request may check its password.
+
+        Args:
+            ip (str): The client address.
+            email (str): The email the client authenticates as.
+
+        Returns:
+            Optional[int]: None if allowed, in which case `record` must be
+            called with the outcome; otherwise 429.
+        """
+        with self._lock:
+            if self._throttled(ip, email, time.monotonic()):
+                return 429
+        return None
+
+    def admit(self, ip: str, email: str) -> Optional[int]:
+        """
+        Decide whether a login attempt may check its password.
+
+        Args:
+            ip (str): The client address.
+            email (str): The email the client logs in as.
+
+        Returns:
+            Optional[int]: None if admitted, in which case `release` must
+            be called once the check is done; otherwise the HTTP status
+            to reject the attempt with (429 or 503).
+        """
+        with self._lock:
+            if self._throttled(ip, email, time.monotonic()):
+                return 429
+            if self.pending >= self.max_pending:
+                return 503
+            self.pending += 1
+        return None
+
+    def record(self, ip: str, email: str, success: bool) -> None:
+        """
+        Record the outcome of a password check.
+
+        Args:
+            ip (str): The client address.
+            email (str): The email the client authenticated as.
+            success (bool): Whether the password was valid.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._record(ip, email, success, now)
+
+    def release(self, ip: str, email: str, success: bool) -> None:
+        """
+        Record the outcome of an admitted login.
+
+        Args:
+            ip (str): The client address.
+            email (str): The email the client logged in as.
+            success (bool): Whether the password was valid.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.pending -= 1
+            self._record(ip, email, success, now)
+
+
+LOGIN_THROTTLE = LoginThrottle()
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """Module for index views
 """
-from flask import jsonify, abort
+import os
+from flask import jsonify, abort, request, Response
 from api.v1.views import app_views
 
 
@@ -25,6 +26,42 @@ def stats() -> str:
     return jsonify(stats)
 
 
+@app_views.route('/metrics', methods=['GET'], strict_slashes=False)
+def metrics() -> Response:
+    """GET /api/v1/metrics
+    Return:
+        - Latency histograms in the Prometheus text format
+    """
+    from api.v1.metrics import render
+    return Response(render(),
+                    mimetype='text/plain; version=0.0.4')
+
+
+@app_views.route('/profiling', methods=['GET', 'PUT'], strict_slashes=False)
+def profiling() -> str:
+    """GET/PUT /api/v1/profiling
+    Restricted to the users listed in PROFILING_ADMINS (emails or ids).
+    JSON body parameters (PUT):
+      - rate: fraction of requests to profile, 0 disables profiling
+    Return:
+        - The sampling rate and the collapsed stack files just dumped
+        - 403 if the current user is not a profiling admin
+        - 400 if the rate is not a number
+    """
+    from api.v1 import profiling
+    admins = os.getenv('PROFILING_ADMINS', '').split(',')
+    user = getattr(request, 'current_user', None)
+    if user is None or not ({user.id, user.email} & set(admins)):
+        abort(403)
+    if request.method == 'PUT':
+        rj = request.get_json(silent=True) or {}
+        try:
+            profiling.set_rate(float(rj.get('rate')))
+        except (TypeError, ValueError):
+            return jsonify({'error': "rate missing"}), 400
+    return jsonify({'rate': profiling.rate, 'files': profiling.dump()})
+
+
 @app_views.route('/unauthorized/', strict_slashes=False)
 def unauthorized() -> None:
     """GET /api/v1/unauthorized
@@ -6,6 +6,7 @@ from typing import Tuple
 from flask import abort, jsonify, request
 
 from models.user import User
+from api.v1.throttle import LOGIN_THROTTLE
 from api.v1.views import app_views
 
 @app_views.route('/auth_session/login', methods=['POST'], strict_slashes=False)
@@ -17,6 +18,8 @@ def login() -> Tuple[str, int]:
         - 400 if email or password is missing.
         - 404 if user is not found.
         - 401 if password is incorrect.
+        - 429 if too many logins failed for this client or email.
+        - 503 if too many passwords are being checked already.
     """
     email = request.form.get('email')
     if not email:
@@ -25,15 +28,24 @@ def login() -> Tuple[str, int]:
     if not password:
         return jsonify({"error": "password missing"}), 400
 
+    ip = request.remote_addr
+    status = LOGIN_THROTTLE.admit(ip, email)
+    if status is not None:
+        abort(status)
+    valid = False
     try:
-        users = User.search({'email': email})
-    except Exception:
-        return jsonify({"error": "no user found for this email"}), 404
+        try:
+            users = User.search({'email': email})
+        except Exception:
+            users = []
+        valid = bool(users) and users[0].is_valid_password(password)
+    finally:
+        LOGIN_THROTTLE.release(ip, email, valid)
 
     if not users:
         return jsonify({"error": "no user found for this email"}), 404
 
-    if users[0].is_valid_password(password):
+    if valid:
         from api.v1.app import auth
         session_id = auth.create_session(users[0].id)
         response = jsonify(users[0].to_json())
@@ -1,18 +1,75 @@
 #!/usr/bin/env python3
 """Module for User-related routes and views.
 """
+from datetime import datetime, timezone
+
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import abort, current_app, jsonify, request, Response
+from models.base import parse_timestamp
+from models.query import OPERATORS
 from models.user import User
 
+# Attributes GET /api/v1/users can be filtered on
+SEARCHABLE_ATTRIBUTES = ('email', 'first_name', 'last_name',
+                         'created_at', 'updated_at')
+
+
+def _json_response(body: str, status: int = 200) -> Response:
+    """Build a response from a JSON document encoded like `jsonify`.
+    """
+    return current_app.response_class(body + '\n', status=status,
+                                      mimetype='application/json')
+
+def _query_timestamp(value: str) -> datetime:
+    """Parse a timestamp query parameter.
+
+    Stored timestamps are naive UTC, so one carrying a UTC offset is
+    converted to naive UTC: comparing it as is would raise TypeError.
+    """
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is None:
+            raise
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _destroy_all_sessions(user_id: str) -> None:
+    """Revoke every session of a user with the current auth provider.
+    """
+    from api.v1.app import auth
+    if auth is not None:
+        auth.destroy_all_sessions(user_id)
+
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """GET /api/v1/users
+    Query parameters, all optional and combined:
+      - <attr>: attribute equal to the value
+      - <attr>__gt, <attr>__gte, <attr>__lt, <attr>__lte: range bounds
+      - <attr>__startswith: prefix of the attribute
+      where <attr> is one of SEARCHABLE_ATTRIBUTES; timestamps use the
+      %Y-%m-%dT%H:%M:%S format, in UTC unless followed by an offset.
     Returns:
-      - JSON list of all User objects.
+      - JSON list of the matching User objects, all of them by default.
+      - 400 error if a timestamp is malformed.
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    attributes = {}
+    for key, value in request.args.items():
+        attr, _, op = key.rpartition('__')
+        if not attr or op not in OPERATORS:
+            attr = key
+        if attr not in SEARCHABLE_ATTRIBUTES:
+            continue
+        if attr in ('created_at', 'updated_at') and op != 'startswith':
+            try:
+                value = _query_timestamp(value)
+            except ValueError:
+                return jsonify({'error': "invalid {}".format(key)}), 400
+        attributes[key] = value
+    users = User.search(attributes) if attributes else User.all()
+    all_users = ','.join(user.to_json_str() for user in users)
+    return _json_response('[' + all_users + ']')
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
 def view_one_user(user_id: str = None) -> str:
@@ -29,11 +86,11 @@ def view_one_user(user_id: str = None) -> str:
         if request.current_user is None:
             abort(404)
         else:
-            return jsonify(request.current_user.to_json())
+            return _json_response(request.current_user.to_json_str())
     user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    return _json_response(user.to_json_str())
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
 def delete_user(user_id: str = None) -> str:
@@ -41,7 +98,8 @@ def delete_user(user_id: str = None) -> str:
     Path parameter:
       - user_id: ID of the user.
     Returns:
-      - Empty JSON if the User has been successfully deleted.
+      - Empty JSON if the User has been successfully deleted, along with
+        all of their sessions.
       - 404 error if the User ID does not exist.
     """
     if user_id is None:
@@ -50,6 +108,7 @@ def delete_user(user_id: str = None) -> str:
     if user is None:
         abort(404)
     user.remove()
+    _destroy_all_sessions(user.id)
     return jsonify({}), 200
 
 @app_views.route('/users', methods=['POST'], strict_slashes=False)
@@ -84,7 +143,7 @@ def create_user() -> str:
             user.first_name = rj.get("first_name")
             user.last_name = rj.get("last_name")
             user.save()
-            return jsonify(user.to_json()), 201
+            return _json_response(user.to_json_str(), 201)
         except Exception as e:
             error_msg = "Can't create User: {}".format(e)
     return jsonify({'error': error_msg}), 400
@@ -97,10 +156,13 @@ def update_user(user_id: str = None) -> str:
     JSON body parameters:
       - last_name (optional): Last name of the user.
       - first_name (optional): First name of the user.
+      - password (optional): New password of the user, whose sessions
+        are then all revoked. Only the user themselves may change it.
     Returns:
       - JSON representation of the updated User object.
       - 404 error if the User ID does not exist.
       - 400 error if the User cannot be updated.
+      - 403 error if the password of another user is changed.
     """
     if user_id is None:
         abort(404)
@@ -114,10 +176,18 @@ def update_user(user_id: str = None) -> str:
         rj = None
     if rj is None:
         return jsonify({'error': "Wrong format"}), 400
+    if rj.get('password'):
+        current_user = getattr(request, 'current_user', None)
+        if current_user is None or current_user.id != user.id:
+            abort(403)
     if rj.get('first_name') is not None:
         user.first_name = rj.get('first_name')
     if rj.get('last_name') is not None:
         user.last_name = rj.get('last_name')
+    if rj.get('password'):
+        user.password = rj.get('password')
     user.save()
-    return jsonify(user.to_json()), 200
+    if rj.get('password'):
+        _destroy_all_sessions(user.id)
+    return _json_response(user.to_json_str())
 
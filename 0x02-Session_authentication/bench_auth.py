@@ -0,0 +1,823 @@
+#!/usr/bin/env python3
+"""Benchmark of `GET /api/v1/users/me` for every AUTH_TYPE.
+
+For each auth provider and dataset size, N users (and one session per
+user for the session providers) are seeded, then authenticated requests
+are sent through the Flask test client. The report is printed as JSON.
+
+With --fanout THREADS, each round instead sends THREADS concurrent
+requests carrying the same credentials, once with single-flight lookup
+coalescing and once without, and the CPU time of both runs is reported.
+
+With --sliding SECONDS, session_db_auth serves requests spread over all
+sessions for SECONDS, in sliding expiration mode, once persisting every
+last-seen update and once with a 1 s granularity and flush interval;
+the journal appends, snapshots and bytes written of both runs are
+reported.
+
+With --updates UPDATES, UPDATES `PUT /api/v1/users/<id>` requests each
+change the first name of a random user, and the journal appends,
+snapshots and bytes written per update are reported; a few more
+updates each followed by a full snapshot, as every save used to write,
+are measured the same way.
+
+With --zipf EXPONENT, basic_auth serves requests whose users follow a
+Zipf distribution, with every user in memory and with bounded model
+caches of 10% and 1% of the users; the RSS growth, cache hit rate and
+latency of each run are reported. Each run loads the store in its own
+forked process, so that their memory use can be compared.
+
+With --stress THREADS, 1 to THREADS reader threads search the users,
+by email and by scan, while a writer thread updates, creates, removes
+and snapshots them, for a second per thread count; the read and write
+throughput and any exception raised are reported, then the class file
+is reloaded and checked against the objects in memory.
+
+With --crud OPERATIONS, the User model is run on the JSON and on the
+SQLite store, each in its own forked process: SIZE users are saved,
+then OPERATIONS creates, updates, gets, searches by email, counts and
+removes are timed, and the mean time of each is reported.
+
+With --attack IPS, basic_auth serves REQUESTS wrong passwords sent from
+IPS addresses, half of them for the email of a victim and half for
+random emails, interleaved with valid requests of the victim from its
+own address; this runs once without and once with the login throttle.
+The statuses of both clients, the passwords checked and the CPU time of
+each run are reported.
+
+With --metrics, the requests of the default benchmark are served once
+with the latency metrics and once with every histogram observation and
+auth phase timer replaced by a no-op, and the throughput and latency of
+both runs are reported.
+
+With --serialize, SIZE users are loaded from their class file, turned
+into dicts by `to_json` and encoded by `to_json_str`, with timestamps
+parsed and formatted by strptime/strftime and the standard json module,
+as before, then by fromisoformat/isoformat, then also with orjson when
+it is installed; the objects per second of each step are reported.
+
+With --list, basic_auth serves REQUESTS `GET /api/v1/users` requests
+listing all SIZE users, once building every response from the JSON
+cached on each user and once serializing every user again, and the
+throughput, latency and response size of both runs are reported.
+
+With --encode, `GET /api/v1/users` listing all SIZE users is served
+REQUESTS times and the users are written to their class file a few
+times, every user being serialized again each time, once with the
+standard json module and once with orjson when it is installed; the
+mean time of a response and of a snapshot are reported for both.
+
+With --bloom, Bloom filters of SIZE emails are built sized for twice
+as many values, as a class file load does, sized exactly, and grown
+from the minimum capacity; the memory, layers, false-positive rate over
+100000 unknown emails and time of a miss of each are reported. Then
+SIZE users are seeded and searched by REQUESTS unknown emails by scan,
+through the email index and through the filter.
+
+With --range, SIZE users are searched by email equality, by an email
+prefix, by a created_at range holding 1% of them and by a range holding
+10% combined with a prefix, each query REQUESTS times, capped at 10,
+through the sorted indexes and by scan; the hits and mean time of each
+query are reported.
+
+Usage: ./bench_auth.py [-s SIZE ...] [-r REQUESTS] [-t AUTH_TYPE ...]
+                       [-f THREADS] [--sliding SECONDS] [--zipf EXPONENT]
+                       [--stress THREADS] [--crud OPERATIONS]
+                       [--attack IPS] [--updates UPDATES] [--metrics]
+                       [--serialize] [--list] [--encode] [--bloom]
+                       [--range]
+"""
+import argparse
+import base64
+import contextlib
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+from unittest import mock
+
+os.environ.setdefault('SESSION_NAME', '_my_session_id')
+os.environ.setdefault('SESSION_DURATION', '3600')
+os.environ.setdefault('SESSION_SIGNING_KEYS', 'bench:bench-secret')
+os.chdir(tempfile.mkdtemp(prefix='bench_auth_'))
+
+import api.v1.app as app_module  # noqa: E402
+import api.v1.auth.basic_auth as basic_auth  # noqa: E402
+import api.v1.metrics as metrics  # noqa: E402
+import models.base  # noqa: E402
+from api.v1.auth import AUTH_PROVIDERS, load_auth  # noqa: E402
+from api.v1.auth.auth import Auth  # noqa: E402
+from api.v1.auth.session_auth import SessionAuth  # noqa: E402
+from api.v1.auth.session_db_auth import SessionDBAuth  # noqa: E402
+from api.v1.auth.session_exp_auth import SessionExpAuth  # noqa: E402
+from api.v1.metrics import resident_memory_bytes  # noqa: E402
+from api.v1.throttle import LoginThrottle, TokenBuckets  # noqa: E402
+from models import fast_json, journal, snapshot  # noqa: E402
+from models.bloom import MIN_CAPACITY, BloomFilter  # noqa: E402
+from models.base import DATA, LOADED  # noqa: E402
+from models.user import User  # noqa: E402
+from models.user_session import UserSession  # noqa: E402
+
+PASSWORD = 'bench-pwd'
+
+
+def seed(auth: Auth, size: int) -> List[User]:
+    """Replace the stores with `size` users and their sessions."""
+    SessionAuth.user_id_by_session_id.clear()
+    SessionAuth.session_ids_by_user_id.clear()
+    DATA['User'] = {}
+    DATA['UserSession'] = {}
+    LOADED.update(DATA)
+    users = []
+    for i in range(size):
+        user = User(email='user{}@bench.io'.format(i))
+        user.password = PASSWORD
+        DATA['User'][user.id] = user
+        users.append(user)
+    User.save_to_file()
+    # Reload to build the Bloom filters and sorted indexes
+    User.load_from_file()
+    users = list(DATA['User'].values())
+    if isinstance(auth, SessionAuth):
+        for user in users:
+            if not isinstance(auth, SessionDBAuth):
+                auth.create_session(user.id)
+                continue
+            # Bypass the per-session file write of SessionDBAuth
+            session_id = SessionExpAuth.create_session(auth, user.id)
+            user_session = UserSession(user_id=user.id,
+                                       session_id=session_id)
+            DATA['UserSession'][user_session.id] = user_session
+        UserSession.save_to_file()
+        UserSession.load_from_file()
+    return users
+
+
+def credentials(auth: Auth, user: User) -> Dict[str, str]:
+    """Return the headers authenticating a request as `user`."""
+    if isinstance(auth, SessionAuth):
+        session_id = auth.create_session(user.id)
+        return {'Cookie': '{}={}'.format(os.environ['SESSION_NAME'],
+                                         session_id)}
+    token = base64.b64encode('{}:{}'.format(user.email, PASSWORD).encode())
+    return {'Authorization': 'Basic ' + token.decode()}
+
+
+def bench(auth_type: str, size: int, requests: int) -> Dict:
+    """Time authenticated `GET /api/v1/users/me` requests."""
+    auth = load_auth(auth_type)
+    app_module.auth = auth
+    users = seed(auth, size)
+    client = app_module.app.test_client(use_cookies=False)
+    targets = [credentials(auth, random.choice(users)) for _ in range(16)]
+    client.get('/api/v1/users/me', headers=targets[0])
+    latencies, statuses = [], {}
+    for i in range(requests):
+        start = time.perf_counter()
+        response = client.get('/api/v1/users/me',
+                              headers=targets[i % len(targets)])
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] = \
+            statuses.get(response.status_code, 0) + 1
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'auth_type': auth_type,
+        'users': size,
+        'requests': requests,
+        'statuses': statuses,
+        'rps': requests / total,
+        'mean_us': total / requests * 1e6,
+        'p50_us': latencies[requests // 2] * 1e6,
+        'p99_us': latencies[min(requests - 1, int(requests * 0.99))] * 1e6,
+    }
+
+
+def bench_fanout(auth_type: str, size: int, rounds: int,
+                 threads: int) -> Dict:
+    """Time rounds of concurrent requests sharing the same credentials."""
+    auth = load_auth(auth_type)
+    app_module.auth = auth
+    users = seed(auth, size)
+    headers = credentials(auth, random.choice(users))
+    clients = [app_module.app.test_client(use_cookies=False)
+               for _ in range(threads)]
+    report = {'auth_type': auth_type, 'users': size, 'rounds': rounds,
+              'threads': threads}
+    for coalesce in (False, True):
+        auth.coalesce_lookups = coalesce
+        barrier = threading.Barrier(threads)
+        lock = threading.Lock()
+        statuses = {}
+
+        def worker(client):
+            for _ in range(rounds):
+                barrier.wait()
+                status = client.get('/api/v1/users/me',
+                                    headers=headers).status_code
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        workers = [threading.Thread(target=worker, args=(client,))
+                   for client in clients]
+        cpu, wall = time.process_time(), time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        name = 'coalesced' if coalesce else 'independent'
+        report[name] = {
+            'statuses': statuses,
+            'cpu_ms': (time.process_time() - cpu) * 1e3,
+            'wall_ms': (time.perf_counter() - wall) * 1e3,
+        }
+    return report
+
+
+def bytes_written() -> int:
+    """Return the bytes the process has written so far."""
+    with open('/proc/self/io') as f:
+        for line in f:
+            if line.startswith('wchar:'):
+                return int(line.split()[1])
+    return 0
+
+
+@contextlib.contextmanager
+def counting_writes():
+    """Count the journal appends and snapshots made within the block.
+
+    Yields a dict whose 'appends', 'snapshots' and 'bytes' (every byte
+    the process wrote) are filled in when the block exits.
+    """
+    counts = {'appends': 0, 'snapshots': 0}
+    append, write = journal.append, snapshot.write
+
+    def counting_append(*args, **kwargs):
+        counts['appends'] += 1
+        return append(*args, **kwargs)
+
+    def counting_write(*args, **kwargs):
+        counts['snapshots'] += 1
+        return write(*args, **kwargs)
+
+    journal.append, snapshot.write = counting_append, counting_write
+    start = bytes_written()
+    try:
+        yield counts
+    finally:
+        counts['bytes'] = bytes_written() - start
+        journal.append, snapshot.write = append, write
+
+
+def bench_sliding(size: int, seconds: float) -> Dict:
+    """Count the store writes of sustained sliding-session traffic."""
+    auth = load_auth('session_db_auth')
+    app_module.auth = auth
+    users = seed(auth, size)
+    client = app_module.app.test_client(use_cookies=False)
+    targets = [credentials(auth, user) for user in users]
+    report = {'sessions': len(targets), 'seconds': seconds}
+    for name, granularity in (('every_request', 0.0), ('batched', 1.0)):
+        auth.sliding = True
+        auth.last_seen_granularity = granularity
+        auth.last_seen_flush_interval = granularity
+        # Also restarts the flush interval with the new settings
+        auth.flush_last_seen()
+        requests = 0
+        with counting_writes() as writes:
+            end = time.perf_counter() + seconds
+            while time.perf_counter() < end:
+                client.get('/api/v1/users/me',
+                           headers=targets[requests % len(targets)])
+                requests += 1
+            auth.flush_last_seen()
+        report[name] = {'requests': requests, 'writes': writes,
+                        'rps': requests / seconds}
+    return report
+
+
+def bench_updates(size: int, updates: int) -> Dict:
+    """Count the bytes written by `PUT /api/v1/users/<id>` requests."""
+    app_module.auth = None
+    users = seed(Auth(), size)
+    client = app_module.app.test_client(use_cookies=False)
+    report = {'users': size}
+    # A full snapshot per update was the former behavior
+    for name, count in (('delta', updates), ('snapshot', min(updates, 5))):
+        start = time.perf_counter()
+        with counting_writes() as writes:
+            for i in range(count):
+                user = random.choice(users)
+                client.put('/api/v1/users/' + user.id,
+                           json={'first_name': 'name{}'.format(i)})
+                if name == 'snapshot':
+                    User.save_to_file()
+        report[name] = {
+            'updates': count,
+            'writes': writes,
+            'bytes_per_update': writes['bytes'] / count,
+            'ms_per_update': (time.perf_counter() - start) / count * 1e3,
+        }
+    return report
+
+
+def in_child(func, *args) -> Dict:
+    """Run `func` in a forked process and return its JSON result."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        with os.fdopen(write_fd, 'w') as f:
+            json.dump(func(*args), f)
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        result = json.load(f)
+    os.waitpid(pid, 0)
+    return result
+
+
+def zipf_run(size: int, requests: int, exponent: float,
+             capacity: int) -> Dict:
+    """Load the users with a cache capacity and serve Zipfian requests."""
+    models.base.CACHE_SIZE = capacity
+    DATA.clear()
+    LOADED.clear()
+    app_module.auth = load_auth('basic_auth')
+    client = app_module.app.test_client(use_cookies=False)
+    rss = resident_memory_bytes()
+    User.count()
+    # The same workload for every capacity: hot users spread in the file
+    rng = random.Random(0)
+    order = rng.sample(range(size), size)
+    cum_weights = list(itertools.accumulate(
+        1 / (rank + 1) ** exponent for rank in range(size)))
+    ranks = rng.choices(range(size), cum_weights=cum_weights,
+                        k=2 * requests)
+    del cum_weights
+    headers = []
+    for rank in ranks:
+        token = base64.b64encode('user{}@bench.io:{}'.format(
+            order[rank], PASSWORD).encode())
+        headers.append({'Authorization': 'Basic ' + token.decode()})
+    del order, ranks
+    # The first half warms the cache up
+    for i in range(requests):
+        client.get('/api/v1/users/me', headers=headers[i])
+    cache = DATA['User']
+    if capacity:
+        cache.hits = cache.misses = 0
+    latencies, statuses = [], {}
+    for i in range(requests, 2 * requests):
+        start = time.perf_counter()
+        response = client.get('/api/v1/users/me', headers=headers[i])
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] = \
+            statuses.get(response.status_code, 0) + 1
+    latencies.sort()
+    report = {
+        'capacity': capacity or 'unbounded',
+        'statuses': statuses,
+        'rss_growth_mb': (resident_memory_bytes() - rss) / 2 ** 20,
+        'p50_us': latencies[requests // 2] * 1e6,
+        'p99_us': latencies[min(requests - 1, int(requests * 0.99))] * 1e6,
+    }
+    if capacity:
+        lookups = cache.hits + cache.misses
+        report['hit_rate'] = cache.hits / lookups if lookups else None
+    return report
+
+
+def bench_zipf(size: int, requests: int, exponent: float) -> Dict:
+    """Compare bounded model caches under a Zipfian load."""
+    # Seeded in a child too, for no run to inherit the seeded objects
+    in_child(lambda: len(seed(load_auth('basic_auth'), size)))
+    runs = [in_child(zipf_run, size, requests, exponent, capacity)
+            for capacity in (0, max(1, size // 10), max(1, size // 100))]
+    return {'users': size, 'requests': requests, 'exponent': exponent,
+            'runs': runs}
+
+
+def bench_stress(size: int, threads: int) -> Dict:
+    """Run concurrent readers against a writer and check the store."""
+    users = seed(Auth(), size)
+    emails = [user.email for user in users]
+    report = {'users': size, 'runs': []}
+    for readers in sorted({1, 2, 4, threads} & set(range(1, threads + 1))):
+        stop = threading.Event()
+        counts = [0] * (readers + 1)
+        errors = {}
+        lock = threading.Lock()
+
+        def record(error):
+            name = type(error).__name__
+            with lock:
+                errors[name] = errors.get(name, 0) + 1
+
+        def reader(slot):
+            rng = random.Random(slot)
+            while not stop.is_set():
+                try:
+                    if rng.random() < 0.01:
+                        User.search({'last_name': 'nobody'})
+                    else:
+                        User.search({'email': rng.choice(emails)})
+                except Exception as error:
+                    record(error)
+                counts[slot] += 1
+
+        def writer():
+            rng = random.Random(-1)
+            while not stop.is_set():
+                try:
+                    user = User.get(rng.choice(users).id)
+                    if user is not None:
+                        user.first_name = str(counts[readers])
+                        user.save()
+                    if counts[readers] % 20 == 0:
+                        User(email='new{}@bench.io'.format(
+                            counts[readers])).save()
+                        extra = User.search({'email__startswith': 'new'})
+                        if len(extra) > 10:
+                            extra[0].remove()
+                    if counts[readers] % 200 == 0:
+                        User.save_to_file()
+                except Exception as error:
+                    record(error)
+                counts[readers] += 1
+
+        workers = [threading.Thread(target=reader, args=(slot,))
+                   for slot in range(readers)]
+        workers.append(threading.Thread(target=writer))
+        for thread in workers:
+            thread.start()
+        time.sleep(1)
+        stop.set()
+        for thread in workers:
+            thread.join()
+        report['runs'].append({'readers': readers,
+                               'reads_per_s': sum(counts[:readers]),
+                               'writes_per_s': counts[readers],
+                               'errors': errors})
+    in_memory = {user.id: user.to_json(True) for user in User.all()}
+    User.load_from_file()
+    report['file_matches_memory'] = in_memory == {
+        user.id: user.to_json(True) for user in User.all()}
+    return report
+
+
+def crud_run(store: str, size: int, operations: int) -> Dict:
+    """Time the model operations of a store."""
+    models.base.SQLITE = store == 'sqlite'
+    DATA.clear()
+    LOADED.clear()
+    users = [User(email='{}-{}@bench.io'.format(store, i))
+             for i in range(size)]
+    User.save_many(users)
+    picks = random.sample(users, min(size, operations))
+    report = {'store': store}
+
+    def timed(name, func, args):
+        start = time.perf_counter()
+        for arg in args:
+            func(arg)
+        report[name + '_us'] = (time.perf_counter() - start) / len(args) * 1e6
+
+    def update(user):
+        user.first_name = 'updated'
+        user.save()
+
+    timed('create', lambda i: User(email='new{}@bench.io'.format(i)).save(),
+          range(len(picks)))
+    timed('update', update, picks)
+    timed('get', lambda user: User.get(user.id), picks)
+    timed('search', lambda user: User.search({'email': user.email}), picks)
+    timed('count', lambda user: User.count(), picks)
+    timed('remove', lambda user: user.remove(), picks)
+    return report
+
+
+def bench_attack(size: int, requests: int, ips: int) -> Dict:
+    """Serve a credential-guessing attack next to a legitimate client."""
+    auth = load_auth('basic_auth')
+    app_module.auth = auth
+    users = seed(auth, size)
+    client = app_module.app.test_client(use_cookies=False)
+    victim = random.choice(users)
+    headers = credentials(auth, victim)
+
+    def guess(email: str) -> Dict[str, str]:
+        token = base64.b64encode('{}:wrong'.format(email).encode())
+        return {'Authorization': 'Basic ' + token.decode()}
+
+    checks = [0]
+    is_valid_password = User.is_valid_password
+
+    def counting_is_valid_password(user, pwd):
+        checks[0] += 1
+        return is_valid_password(user, pwd)
+
+    User.is_valid_password = counting_is_valid_password
+    throttle = basic_auth.LOGIN_THROTTLE
+    report = {'users': size, 'requests': requests, 'ips': ips}
+    try:
+        for name in ('unthrottled', 'throttled'):
+            basic_auth.LOGIN_THROTTLE = LoginThrottle()
+            if name == 'unthrottled':
+                unlimited = TokenBuckets(1.0, float('inf'), 1)
+                basic_auth.LOGIN_THROTTLE.by_ip = unlimited
+                basic_auth.LOGIN_THROTTLE.by_email = unlimited
+            checks[0] = 0
+            attacker, legitimate = {}, {}
+            cpu = time.process_time()
+            for i in range(requests):
+                email = victim.email if i % 2 else random.choice(users).email
+                status = client.get(
+                    '/api/v1/users/me', headers=guess(email),
+                    environ_base={'REMOTE_ADDR': '10.0.{}.{}'.format(
+                        i % ips // 256, i % ips % 256)}).status_code
+                attacker[status] = attacker.get(status, 0) + 1
+                if i % 10 == 0:
+                    status = client.get(
+                        '/api/v1/users/me', headers=headers,
+                        environ_base={'REMOTE_ADDR': '192.0.2.1'}
+                    ).status_code
+                    legitimate[status] = legitimate.get(status, 0) + 1
+            report[name] = {
+                'attacker_statuses': attacker,
+                'victim_statuses': legitimate,
+                'password_checks': checks[0],
+                'cpu_ms': (time.process_time() - cpu) * 1e3,
+            }
+    finally:
+        User.is_valid_password = is_valid_password
+        basic_auth.LOGIN_THROTTLE = throttle
+    return report
+
+
+def bench_crud(size: int, operations: int) -> Dict:
+    """Compare the model operations of the JSON and SQLite stores."""
+    return {'users': size, 'operations': operations,
+            'runs': [in_child(crud_run, store, size, operations)
+                     for store in ('json', 'sqlite')]}
+
+
+def bench_metrics(auth_type: str, size: int, requests: int) -> Dict:
+    """Time authenticated requests with and without the metrics."""
+    report = {'auth_type': auth_type, 'users': size, 'requests': requests}
+    for name in ('metrics', 'no_metrics'):
+        with contextlib.ExitStack() as stack:
+            if name == 'no_metrics':
+                stack.enter_context(mock.patch.object(
+                    metrics.Histogram, 'observe', lambda *args: None))
+                stack.enter_context(mock.patch.multiple(
+                    metrics.auth_phase, __enter__=lambda self: None,
+                    __exit__=lambda self, *exc_info: None))
+            run = bench(auth_type, size, requests)
+        report[name] = {key: run[key] for key in
+                        ('statuses', 'rps', 'mean_us', 'p50_us', 'p99_us')}
+    report['overhead_us'] = report['metrics']['mean_us'] - \
+        report['no_metrics']['mean_us']
+    return report
+
+
+def bench_serialize(size: int) -> Dict:
+    """Time loading, converting and encoding the users."""
+    seed(Auth(), size)
+    report = {'users': size, 'orjson': fast_json.orjson is not None}
+    for name in ('strptime_stdlib', 'fromisoformat_stdlib',
+                 'fromisoformat_orjson'):
+        with contextlib.ExitStack() as stack:
+            if name.startswith('strptime'):
+                stack.enter_context(mock.patch.multiple(
+                    models.base,
+                    parse_timestamp=lambda value: datetime.strptime(
+                        value, models.base.TIMESTAMP_FORMAT),
+                    format_timestamp=lambda value: value.strftime(
+                        models.base.TIMESTAMP_FORMAT)))
+            if name.endswith('stdlib'):
+                stack.enter_context(
+                    mock.patch.object(fast_json, 'orjson', None))
+            start = time.perf_counter()
+            User.load_from_file()
+            load = time.perf_counter() - start
+            users = list(DATA['User'].values())
+            start = time.perf_counter()
+            for user in users:
+                user.to_json(True)
+            to_json = time.perf_counter() - start
+            # Encoded from the dicts cached above
+            start = time.perf_counter()
+            for user in users:
+                user.to_json_str(True)
+            encode = time.perf_counter() - start
+        report[name] = {'load_per_s': size / load,
+                        'to_json_per_s': size / to_json,
+                        'encode_per_s': size / encode}
+    return report
+
+
+def bench_list(size: int, requests: int) -> Dict:
+    """Time `GET /api/v1/users` with and without the cached JSON."""
+    auth = load_auth('basic_auth')
+    app_module.auth = auth
+    users = seed(auth, size)
+    client = app_module.app.test_client(use_cookies=False)
+    headers = credentials(auth, random.choice(users))
+    report = {'users': size, 'requests': requests}
+    for name in ('cached', 'uncached'):
+        with contextlib.ExitStack() as stack:
+            if name == 'uncached':
+                # A new cache for each call: nothing is reused
+                stack.enter_context(mock.patch.object(
+                    models.base.Base, '_serializations', lambda self: {}))
+            size_bytes = len(client.get('/api/v1/users',
+                                        headers=headers).data)
+            latencies = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                client.get('/api/v1/users', headers=headers)
+                latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        report[name] = {
+            'rps': requests / sum(latencies),
+            'p50_ms': latencies[requests // 2] * 1e3,
+            'p99_ms': latencies[min(requests - 1,
+                                    int(requests * 0.99))] * 1e3,
+            'bytes': size_bytes,
+        }
+    return report
+
+
+def bench_encode(size: int, requests: int) -> Dict:
+    """Time list responses and snapshots with json and with orjson."""
+    auth = load_auth('basic_auth')
+    app_module.auth = auth
+    users = seed(auth, size)
+    client = app_module.app.test_client(use_cookies=False)
+    headers = credentials(auth, random.choice(users))
+    snapshots = min(requests, 5)
+    report = {'users': size, 'requests': requests, 'snapshots': snapshots,
+              'orjson': fast_json.orjson is not None}
+
+    def timed(func, times: int) -> float:
+        elapsed = 0.0
+        for _ in range(times):
+            for user in users:
+                user.__dict__.pop('_json_cache', None)
+            start = time.perf_counter()
+            func()
+            elapsed += time.perf_counter() - start
+        return elapsed / times * 1e3
+
+    for name in ('stdlib', 'fast_json'):
+        with contextlib.ExitStack() as stack:
+            if name == 'stdlib':
+                stack.enter_context(
+                    mock.patch.object(fast_json, 'orjson', None))
+            report[name] = {
+                'list_ms': timed(lambda: client.get('/api/v1/users',
+                                                    headers=headers),
+                                 requests),
+                'save_to_file_ms': timed(User.save_to_file, snapshots),
+            }
+    return report
+
+
+def bench_bloom(size: int, requests: int) -> Dict:
+    """Measure Bloom filters of emails and the searches they skip."""
+    emails = ['user{}@bench.io'.format(i) for i in range(size)]
+    unknown = ['nobody{}@bench.io'.format(i) for i in range(100000)]
+    report = {'emails': size, 'unknown': len(unknown)}
+    for name, capacity in (('sized_2n', 2 * size), ('sized_n', size),
+                           ('grown', MIN_CAPACITY)):
+        bloom = BloomFilter(capacity)
+        for email in emails:
+            bloom.add(email)
+        start = time.perf_counter()
+        false_positives = sum(email in bloom for email in unknown)
+        elapsed = time.perf_counter() - start
+        report[name] = {
+            'bytes': bloom.nbytes,
+            'layers': len(bloom._layers),
+            'false_positive_rate': false_positives / len(unknown),
+            'miss_us': elapsed / len(unknown) * 1e6,
+        }
+    del emails
+    seed(Auth(), size)
+    searches = unknown[:requests]
+    for name in ('scan', 'indexed', 'filtered'):
+        with mock.patch.dict(models.base.FILTERS), \
+                mock.patch.dict(models.base.INDEXES):
+            if name != 'filtered':
+                del models.base.FILTERS['User']
+            if name == 'scan':
+                del models.base.INDEXES['User']
+            start = time.perf_counter()
+            for email in searches:
+                User.search({'email': email})
+            elapsed = time.perf_counter() - start
+        report[name] = {'search_miss_us': elapsed / len(searches) * 1e6}
+    return report
+
+
+def bench_range(size: int, requests: int) -> Dict:
+    """Time range and prefix searches with and without the indexes."""
+    users = seed(Auth(), size)
+    # One second apart, the indexes being rebuilt by the reload
+    created = [datetime(2020, 1, 1) + timedelta(seconds=i)
+               for i in range(size)]
+    with mock.patch.dict(models.base.INDEXES):
+        del models.base.INDEXES['User']
+        for user, created_at in zip(users, created):
+            user.created_at = created_at
+    User.save_to_file()
+    User.load_from_file()
+    queries = {
+        'email_equality': {'email': users[size // 2].email},
+        'email_prefix': {'email__startswith': 'user{}'.format(size - 1)[:-2]},
+        'created_at_range_1%': {'created_at__gte': created[size * 99 // 100]},
+        'range_and_prefix_10%': {'created_at__gte': created[size * 9 // 10],
+                                 'email__startswith': 'user'},
+    }
+    runs = min(requests, 10)
+    report = {'users': size, 'runs': runs}
+    for name in ('indexed', 'scan'):
+        with mock.patch.dict(models.base.INDEXES):
+            if name == 'scan':
+                del models.base.INDEXES['User']
+            report[name] = {}
+            for query, attributes in queries.items():
+                start = time.perf_counter()
+                for _ in range(runs):
+                    hits = len(User.search(attributes))
+                elapsed = time.perf_counter() - start
+                report[name][query] = {'hits': hits,
+                                       'ms': elapsed / runs * 1e3}
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-s', '--sizes', type=int, nargs='+',
+                        default=[100, 1000, 10000])
+    parser.add_argument('-r', '--requests', type=int, default=500)
+    parser.add_argument('-t', '--auth-types', nargs='+',
+                        choices=sorted(AUTH_PROVIDERS),
+                        default=list(AUTH_PROVIDERS))
+    parser.add_argument('-f', '--fanout', type=int, metavar='THREADS')
+    parser.add_argument('--sliding', type=float, metavar='SECONDS')
+    parser.add_argument('--zipf', type=float, metavar='EXPONENT')
+    parser.add_argument('--stress', type=int, metavar='THREADS')
+    parser.add_argument('--crud', type=int, metavar='OPERATIONS')
+    parser.add_argument('--attack', type=int, metavar='IPS')
+    parser.add_argument('--updates', type=int, metavar='UPDATES')
+    parser.add_argument('--metrics', action='store_true')
+    parser.add_argument('--serialize', action='store_true')
+    parser.add_argument('--list', action='store_true')
+    parser.add_argument('--encode', action='store_true')
+    parser.add_argument('--bloom', action='store_true')
+    parser.add_argument('--range', action='store_true')
+    args = parser.parse_args()
+    if args.range:
+        report = [bench_range(size, args.requests) for size in args.sizes]
+    elif args.bloom:
+        report = [bench_bloom(size, args.requests) for size in args.sizes]
+    elif args.encode:
+        report = [bench_encode(size, args.requests) for size in args.sizes]
+    elif args.list:
+        report = [bench_list(size, args.requests) for size in args.sizes]
+    elif args.serialize:
+        report = [bench_serialize(size) for size in args.sizes]
+    elif args.metrics:
+        report = [bench_metrics(auth_type, size, args.requests)
+                  for auth_type in args.auth_types for size in args.sizes]
+    elif args.updates:
+        report = [bench_updates(size, args.updates) for size in args.sizes]
+    elif args.attack:
+        report = [bench_attack(size, args.requests, args.attack)
+                  for size in args.sizes]
+    elif args.crud:
+        report = [bench_crud(size, args.crud) for size in args.sizes]
+    elif args.stress:
+        report = [bench_stress(size, args.stress) for size in args.sizes]
+    elif args.zipf:
+        report = [bench_zipf(size, args.requests, args.zipf)
+                  for size in args.sizes]
+    elif args.sliding:
+        report = [bench_sliding(size, args.sliding) for size in args.sizes]
+    elif args.fanout:
+        report = [bench_fanout(auth_type, size, args.requests, args.fanout)
+                  for auth_type in args.auth_types for size in args.sizes]
+    else:
+        report = [bench(auth_type, size, args.requests)
+                  for auth_type in args.auth_types for size in args.sizes]
+    json.dump(report, sys.stdout, indent=2)
+    print()
@@ -1,20 +1,95 @@
 #!/usr/bin/env python3
 """Base module
 """
-import json
+import gc
+import os
 import uuid
-from os import path
+from os import getenv, path
 from datetime import datetime
 from typing import TypeVar, List, Iterable
 
+from models import fast_json, journal, query, snapshot, sqlite_store
+from models.bloom import BloomFilter
+from models.cache import ModelCache
+from models.rwlock import ReadWriteLock
+from models.sorted_index import SortedIndex
+
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+LOADED = set()
+# Bloom filters of the FILTERED_ATTRIBUTES values, by class and attribute
+FILTERS = {}
+# Sorted indexes of the SORTED_ATTRIBUTES values, by class and attribute
+INDEXES = {}
+# Reader-writer locks of the loaded objects, by class
+LOCKS = {}
+# Replay the journal on every access, to see the writes of the other
+# processes of a pre-fork server
+SHARED = getenv('MODEL_STORE_SHARED', '0') == '1'
+# Persist to one SQLite table per class instead of one JSON file
+SQLITE = getenv('MODEL_STORE', 'json') == 'sqlite'
+# Keep at most this many clean objects of each class in memory, faulting
+# the others in from the class file; 0 keeps every object loaded
+CACHE_SIZE = int(getenv('MODEL_CACHE_SIZE', '0'))
+# Bookkeeping attributes that are never serialized
+TRANSIENT_ATTRIBUTES = ('_json_cache', '_dirty')
+
+
+def utcnow() -> datetime:
+    """Current UTC time
+    """
+    return datetime.utcnow()
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse a timestamp written in TIMESTAMP_FORMAT
+
+    `fromisoformat` is much faster than `strptime`, but also accepts
+    dates alone and UTC offsets: it only parses strings laid out like
+    TIMESTAMP_FORMAT, which has no room for an offset, and `strptime`
+    the others, rejecting what it always rejected.
+    """
+    if len(value) == 19 and value[10] == 'T' and \
+            value[13] == value[16] == ':':
+        return datetime.fromisoformat(value)
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def format_timestamp(value: datetime) -> str:
+    """Format a timestamp in TIMESTAMP_FORMAT
+    """
+    if value.tzinfo is not None:
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value.isoformat(timespec='seconds')
+
+
+def preload(*classes: type):
+    """Load classes before the server forks its workers
+
+    The loaded objects are frozen out of the garbage collector so that
+    collections in the workers do not touch, and copy, their pages.
+    The SQLite store keeps no objects in memory: there is nothing to
+    load, and its connections must not be shared with the workers.
+    """
+    if SQLITE:
+        return
+    for cls in classes:
+        cls._objects()
+    gc.freeze()
 
 
 class Base():
     """Base class.
     """
+    # Attributes stored in indexed columns by the SQLite store
+    INDEXED_ATTRIBUTES = ()
+    # String attributes whose values are kept in a Bloom filter, letting
+    # searches for a value no object holds return without a scan
+    FILTERED_ATTRIBUTES = ()
+    # Attributes, with the type of their values, kept in sorted indexes
+    # serving equality, range and prefix searches
+    SORTED_ATTRIBUTES = {}
 
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize a Base
@@ -25,15 +100,13 @@ class Base():
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
-            self.created_at = datetime.utcnow()
+            self.created_at = utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
-            self.updated_at = datetime.utcnow()
+            self.updated_at = utcnow()
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """Equality
@@ -44,69 +117,374 @@ class Base():
             return False
         return (self.id == other.id)
 
+    def __setattr__(self, name: str, value):
+        """Set an attribute, dropping the cached serializations
+
+        Once the object has been persisted, the attribute is also marked
+        as changed, for the next save to only write the changes.
+        """
+        self.__dict__.pop('_json_cache', None)
+        old = self.__dict__.get(name)
+        super().__setattr__(name, value)
+        dirty = self.__dict__.get('_dirty')
+        if dirty is not None:
+            dirty.add(name)
+        if name in self.SORTED_ATTRIBUTES:
+            s_class = self.__class__.__name__
+            indexes = INDEXES.get(s_class)
+            obj_id = self.__dict__.get('id')
+            # Only the stored object of an id is indexed
+            if indexes and self._is_stored():
+                with self._lock().write:
+                    if self._is_stored():
+                        indexes[name].discard(old, obj_id)
+                        indexes[name].add(value, obj_id)
+        if name in self.FILTERED_ATTRIBUTES and isinstance(value, str):
+            filters = FILTERS.get(self.__class__.__name__)
+            if filters is not None:
+                filters[name].add(value)
+
+    def _is_stored(self) -> bool:
+        """Whether the object is the loaded object of its id
+
+        Objects not in memory are not faulted in to find out.
+        """
+        objs = DATA[self.__class__.__name__]
+        obj_id = self.__dict__.get('id')
+        return getattr(objs, 'peek', objs.get)(obj_id) is self
+
+    def _filter_values(self):
+        """Add the filtered attribute values to the filters of the class
+        """
+        filters = FILTERS.get(self.__class__.__name__)
+        if filters is None:
+            return
+        for attr, bloom in filters.items():
+            value = getattr(self, attr, None)
+            if isinstance(value, str):
+                bloom.add(value)
+
+    def _serializations(self) -> dict:
+        """Serializations cached until the next attribute change
+        """
+        cache = self.__dict__.get('_json_cache')
+        if cache is None:
+            cache = self.__dict__['_json_cache'] = {}
+        return cache
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """Convert to JSON
         """
-        result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
-            else:
-                result[key] = value
-        return result
+        cache = self._serializations()
+        result = cache.get(for_serialization)
+        if result is None:
+            result = {}
+            for key, value in self.__dict__.items():
+                if key in TRANSIENT_ATTRIBUTES:
+                    continue
+                if not for_serialization and key[0] == '_':
+                    continue
+                if type(value) is datetime:
+                    result[key] = format_timestamp(value)
+                else:
+                    result[key] = value
+            cache[for_serialization] = result
+        return dict(result)
+
+    def to_json_str(self, for_serialization: bool = False) -> str:
+        """Convert to a JSON document encoded like Flask's `jsonify`
+        """
+        cache = self._serializations()
+        key = ('str', for_serialization)
+        text = cache.get(key)
+        if text is None:
+            text = fast_json.dumps(self.to_json(for_serialization),
+                                   sort_keys=True)
+            cache[key] = text
+        return text
+
+    @classmethod
+    def _lock(cls) -> ReadWriteLock:
+        """Reader-writer lock of the loaded objects of the class
+
+        Searches read under it; loads, replays and writes change the
+        objects under it. Single lookups by id are atomic without it.
+        """
+        lock = LOCKS.get(cls.__name__)
+        if lock is None:
+            lock = LOCKS.setdefault(cls.__name__, ReadWriteLock())
+        return lock
+
+    @classmethod
+    def _objects(cls) -> dict:
+        """Objects of the class, loaded from file on first use
+
+        Must not be called while reading under the class lock, as it
+        may have to write.
+        """
+        s_class = cls.__name__
+        if s_class not in LOADED:
+            with journal.locked(s_class), cls._lock().write:
+                if s_class not in LOADED:
+                    cls.load_from_file()
+        elif SHARED and journal.has_new(s_class):
+            with cls._lock().write:
+                cls._replay_journal()
+        return DATA[s_class]
+
+    @classmethod
+    def _restore(cls, obj_json: dict) -> TypeVar('Base'):
+        """Rebuild a persisted object, with no pending change
+        """
+        obj = cls(**obj_json)
+        obj.__dict__['_dirty'] = set()
+        return obj
+
+    def _journal_entry(self) -> dict:
+        """Journal entry persisting the object and clearing its changes
+
+        A persisted object only writes the attributes changed since, a
+        new one writes all of them.
+        """
+        dirty = self.__dict__.get('_dirty')
+        self.__dict__['_dirty'] = set()
+        if dirty is None:
+            return {'op': 'save', 'obj': self.to_json(True)}
+        obj_json = self.to_json(True)
+        return {'op': 'update', 'id': self.id,
+                'fields': {name: obj_json[name] for name in dirty
+                           if name in obj_json}}
 
     @classmethod
     def load_from_file(cls):
         """Load all
+
+        The file lock keeps other processes from compacting the journal
+        into a new snapshot between the reads of both.
+        """
+        if SQLITE:
+            sqlite_store.load(cls)
+            return
+        with journal.locked(cls.__name__), cls._lock().write:
+            cls._load_snapshot()
+            journal.reset(cls.__name__)
+            cls._replay_journal()
+
+    @classmethod
+    def _load_snapshot(cls):
+        """Load the objects saved in the class file
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
+        if CACHE_SIZE > 0:
+            cls._load_cached(file_path)
+            return
         DATA[s_class] = {}
-        if not path.exists(file_path):
+        LOADED.add(s_class)
+        objs_json = {}
+        if path.exists(file_path):
+            with open(file_path, 'r') as f:
+                objs_json = fast_json.loads(f.read())
+        # Rebuilt from scratch, which drops the values of removed objects
+        FILTERS[s_class] = {attr: BloomFilter(2 * len(objs_json))
+                            for attr in cls.FILTERED_ATTRIBUTES}
+        for obj_id, obj_json in objs_json.items():
+            DATA[s_class][obj_id] = cls._restore(obj_json)
+        objs = DATA[s_class].values()
+        INDEXES[s_class] = {
+            attr: SortedIndex(kind, ((getattr(obj, attr, None), obj.id)
+                                     for obj in objs))
+            for attr, kind in cls.SORTED_ATTRIBUTES.items()}
+
+    @classmethod
+    def _load_cached(cls, file_path: str):
+        """Index the class file, keeping none of its objects in memory
+
+        The objects are read once, to build the filters and indexes.
+        """
+        s_class = cls.__name__
+        cache = DATA[s_class] = ModelCache(cls, CACHE_SIZE)
+        LOADED.add(s_class)
+        # Built below: the objects read meanwhile must not update them
+        FILTERS.pop(s_class, None)
+        INDEXES.pop(s_class, None)
+        pairs = {attr: [] for attr in
+                 set(cls.FILTERED_ATTRIBUTES).union(cls.SORTED_ATTRIBUTES)}
+        for obj_id, obj in cache.open(file_path):
+            for attr, values in pairs.items():
+                values.append((getattr(obj, attr, None), obj_id))
+        filters = {}
+        for attr in cls.FILTERED_ATTRIBUTES:
+            bloom = filters[attr] = BloomFilter(2 * len(cache))
+            for value, _ in pairs[attr]:
+                if isinstance(value, str):
+                    bloom.add(value)
+        FILTERS[s_class] = filters
+        INDEXES[s_class] = {attr: SortedIndex(kind, pairs[attr])
+                            for attr, kind in cls.SORTED_ATTRIBUTES.items()}
+
+    @classmethod
+    def _reindex(cls, old: TypeVar('Base'), new: TypeVar('Base')):
+        """Move the sorted index entries of an id from one object to another
+
+        Either object may be None, when the id is added or removed.
+        """
+        indexes = INDEXES.get(cls.__name__)
+        if not indexes or old is new:
             return
+        for attr, index in indexes.items():
+            if old is not None:
+                index.discard(getattr(old, attr, None), old.id)
+            if new is not None:
+                index.add(getattr(new, attr, None), new.id)
+
+    @classmethod
+    def _replay_journal(cls):
+        """Apply the changes appended to the journal since the last read
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        These are the changes made since the snapshot was written, or by
+        other processes since the last replay.
+        """
+        s_class = cls.__name__
+        rotated, entries = journal.read_new(s_class)
+        if rotated:
+            cls._load_snapshot()
+        objs = DATA[s_class]
+        for entry in entries:
+            if entry['op'] == 'save':
+                obj = cls._restore(entry['obj'])
+            elif entry['op'] == 'update':
+                stored = objs.get(entry['id'])
+                if stored is None:
+                    continue
+                obj_json = stored.to_json(True)
+                obj_json.update(entry['fields'])
+                obj = cls._restore(obj_json)
+            else:
+                cls._reindex(objs.pop(entry['id'], None), None)
+                continue
+            cls._reindex(objs.get(obj.id), obj)
+            objs[obj.id] = obj
+
+    @classmethod
+    def _append_journal(cls, *entries: dict):
+        """Journal changes, with the lock held, compacting if needed
+
+        The journal is folded into a new snapshot once it outgrows both
+        MODEL_JOURNAL_MAX_BYTES and MODEL_JOURNAL_COMPACT_RATIO times the
+        snapshot, which bounds the bytes written per change.
+        """
+        s_class = cls.__name__
+        size = journal.append(s_class, *entries)
+        if size > journal.MAX_BYTES:
+            try:
+                snapshot_size = os.path.getsize(".db_{}.json".format(s_class))
+            except OSError:
+                snapshot_size = 0
+            if size > journal.COMPACT_RATIO * snapshot_size:
+                cls._write_snapshot()
+                journal.rotate(s_class)
 
     @classmethod
     def save_to_file(cls):
         """Save all
+
+        Writes a full snapshot and empties the journal.
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        if SQLITE:
+            return
+        with journal.locked(cls.__name__):
+            cls._objects()
+            # Other writers wait for the file lock: readers may go on
+            with cls._lock().read:
+                cls._write_snapshot()
+                journal.rotate(cls.__name__)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def _write_snapshot(cls):
+        """Write every loaded object to the class file, with the locks held
+
+        Unchanged objects reuse their cached serialization.
+        """
+        file_path = ".db_{}.json".format(cls.__name__)
+        objs = DATA[cls.__name__]
+        if isinstance(objs, ModelCache):
+            objs.write(file_path)
+            return
+        snapshot.write(file_path, ((obj_id, obj.to_json_str(True))
+                                   for obj_id, obj in objs.items()))
+
+    def _store(self, objs: dict):
+        """Put the object among the loaded objects of its class
+        """
+        stored = objs.get(self.id)
+        if stored is not self:
+            # Not the persisted object of its id: write it in full
+            self.__dict__.pop('_dirty', None)
+        self.__class__._reindex(stored, self)
+        objs[self.id] = self
+        self._filter_values()
 
     def save(self):
         """Save current
         """
-        s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        cls = self.__class__
+        self.updated_at = utcnow()
+        if SQLITE:
+            sqlite_store.save(self)
+            return
+        with journal.locked(cls.__name__), cls._lock().write:
+            self._store(cls._objects())
+            cls._append_journal(self._journal_entry())
+
+    @classmethod
+    def save_many(cls, objs: Iterable[TypeVar('Base')],
+                  stored_only: bool = False) -> int:
+        """Save several objects of the class with a single write
+
+        With `stored_only`, objects removed since they were read are
+        skipped, under the write lock, rather than stored again.
+        Returns the number of objects saved.
+        """
+        objs = list(objs)
+        if not objs:
+            return 0
+        now = utcnow()
+        for obj in objs:
+            obj.updated_at = now
+        if SQLITE:
+            return sqlite_store.save_many(cls, objs, stored_only)
+        with journal.locked(cls.__name__), cls._lock().write:
+            stored = cls._objects()
+            if stored_only:
+                objs = [obj for obj in objs if obj.id in stored]
+            for obj in objs:
+                obj._store(stored)
+            if objs:
+                cls._append_journal(
+                    *(obj._journal_entry() for obj in objs))
+        return len(objs)
 
     def remove(self):
         """Remove
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        cls = self.__class__
+        if SQLITE:
+            sqlite_store.remove(self)
+            return
+        with journal.locked(cls.__name__), cls._lock().write:
+            stored = cls._objects().pop(self.id, None)
+            if stored is not None:
+                cls._reindex(stored, None)
+                cls._append_journal({'op': 'remove', 'id': self.id})
 
     @classmethod
     def count(cls) -> int:
         """Count all
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        if SQLITE:
+            return sqlite_store.count(cls)
+        return len(cls._objects())
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -118,20 +496,51 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """Return one by id
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        if SQLITE:
+            return sqlite_store.get(cls, id)
+        return cls._objects().get(id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """Search all
+
+        Keys are attribute names, matched by equality, or `attr__<op>`
+        for the range and prefix operators of `models.query`. When a
+        sorted index serves the search, results come in index order.
         """
+        if SQLITE:
+            return sqlite_store.search(cls, attributes)
         s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-
-        return list(filter(_search, DATA[s_class].values()))
+        cls._objects()
+        predicates = query.parse(attributes)
+        filters = FILTERS.get(s_class)
+        if filters:
+            for attr, op, operand in predicates:
+                if op == 'eq' and attr in filters and \
+                        isinstance(operand, str) and \
+                        operand not in filters[attr]:
+                    return []
+
+        with cls._lock().read:
+            objs = DATA[s_class]
+            candidates = None
+            indexes = INDEXES.get(s_class)
+            if indexes:
+                served = {}
+                for attr, op, operand in predicates:
+                    index = indexes.get(attr)
+                    if index is not None and index.supports(op, operand):
+                        served.setdefault(attr, []).append((op, operand))
+                for attr, index_predicates in served.items():
+                    ids = indexes[attr].lookup(index_predicates)
+                    if candidates is None or len(ids) < len(candidates):
+                        candidates = ids
+            if candidates is None:
+                # Copied, or iterated by the cache under its own lock, to
+                # match them without holding up the writers
+                candidates = objs.values() if isinstance(objs, ModelCache) \
+                    else list(objs.values())
+            else:
+                candidates = [objs[obj_id] for obj_id in candidates
+                              if obj_id in objs]
+        return [obj for obj in candidates if query.matches(obj, predicates)]
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Bloom filter module
+
+A scalable Bloom filter of strings: membership tests never give false
+negatives, so a miss proves a value was never added and the lookup it
+guards can be skipped. When a layer holds its capacity, a larger one is
+stacked on top rather than rebuilding, so values added concurrently are
+never lost. Deletions are not supported: removed values linger, only
+raising the false-positive rate, until the filter is rebuilt.
+
+Values are hashed with the built-in `hash`, randomized per interpreter,
+so a filter must not be persisted; forked workers inherit the seed.
+"""
+import math
+import threading
+
+GROWTH = 4
+MIN_CAPACITY = 1024
+
+
+class _Layer():
+    """Fixed-size Bloom filter
+    """
+    __slots__ = ('bits', 'size', 'hashes', 'capacity', 'count')
+
+    def __init__(self, capacity: int, error_rate: float):
+        """Size the bit array for `capacity` values at `error_rate`
+        """
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) /
+                                math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, h1: int, h2: int) -> list:
+        """Bit positions of a value, by double hashing
+        """
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def __contains__(self, hashes: tuple) -> bool:
+        """Whether every bit of a value is set
+        """
+        h1, h2 = hashes
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class BloomFilter():
+    """Scalable Bloom filter of strings
+    """
+
+    def __init__(self, capacity: int = MIN_CAPACITY,
+                 error_rate: float = 0.001):
+        """Initialize an empty filter
+
+        Layer i gets an error rate of error_rate / 2 ** (i + 1), which
+        bounds the overall rate by error_rate.
+        """
+        self.error_rate = error_rate
+        self._layers = [_Layer(max(capacity, MIN_CAPACITY), error_rate / 2)]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hashes(value: str) -> tuple:
+        """Two independent 32-bit hashes of a value
+        """
+        h = hash(value) & 0xFFFFFFFFFFFFFFFF
+        return h & 0xFFFFFFFF, (h >> 32) | 1
+
+    def __contains__(self, value: str) -> bool:
+        """Whether a value may have been added
+        """
+        hashes = self._hashes(value)
+        for layer in self._layers:
+            if hashes in layer:
+                return True
+        return False
+
+    def add(self, value: str):
+        """Add a value
+        """
+        hashes = self._hashes(value)
+        with self._lock:
+            layers = self._layers
+            for layer in layers:
+                if hashes in layer:
+                    return
+            layer = layers[-1]
+            if layer.count >= layer.capacity:
+                layer = _Layer(layer.capacity * GROWTH,
+                               self.error_rate / 2 ** (len(layers) + 1))
+                layers.append(layer)
+            bits = layer.bits
+            for pos in layer.positions(*hashes):
+                bits[pos >> 3] |= 1 << (pos & 7)
+            layer.count += 1
+
+    def __len__(self) -> int:
+        """Number of distinct values added, give or take false positives
+        """
+        return sum(layer.count for layer in self._layers)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the bit arrays
+        """
+        return sum(len(layer.bits) for layer in self._layers)
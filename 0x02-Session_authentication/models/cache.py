@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Model cache module
+
+Bounded LRU of the objects of one class over its class file, standing in
+for the dict of loaded objects when MODEL_CACHE_SIZE is set, so that the
+memory of a worker follows its working set rather than the dataset.
+Objects are faulted in by id through an index of their locations in the
+file; beyond the capacity, the least recently used ones are dropped.
+Objects that differ from the file, because they were saved or changed
+since it was written, are pinned in memory until the next snapshot.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterator, Tuple, TypeVar
+
+from models import fast_json, snapshot
+
+
+class ModelCache():
+    """Objects of a class by id, with the dict methods the models use
+    """
+
+    def __init__(self, cls: type, capacity: int):
+        """Initialize an empty cache of `capacity` clean objects
+        """
+        self.cls = cls
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._fd = None
+        self._locations = {}
+        self._resident = OrderedDict()
+        self._pinned = {}
+        self._lock = threading.RLock()
+
+    def __del__(self):
+        """Close the class file
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+
+    def open(self, file_path: str) -> Iterator[Tuple[str, TypeVar('Base')]]:
+        """Index a class file, yielding its objects without caching them
+
+        A file in the former single-line format is rewritten first.
+        """
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except FileNotFoundError:
+            return
+        locations = {}
+        with os.fdopen(os.dup(fd), 'rb',
+                       buffering=snapshot.BUFFER_SIZE) as f:
+            if not snapshot.is_scannable(f):
+                objs_json = fast_json.loads(f.read())
+                os.close(fd)
+                snapshot.write(file_path, (
+                    (obj_id, fast_json.dumps(obj_json, sort_keys=True))
+                    for obj_id, obj_json in objs_json.items()))
+                del objs_json
+                yield from self.open(file_path)
+                return
+            for obj_id, location, data in snapshot.scan(f):
+                locations[obj_id] = location
+                yield obj_id, self.cls._restore(fast_json.loads(data))
+        with self._lock:
+            self._fd = fd
+            self._locations = locations
+
+    def _load(self, location: int) -> TypeVar('Base'):
+        """Rebuild the object at a location of the class file
+        """
+        return self.cls._restore(
+            fast_json.loads(snapshot.read(self._fd, location)))
+
+    def _pin(self, obj_id: str, obj: TypeVar('Base')):
+        """Keep an object in memory until the next snapshot
+        """
+        self._pinned[obj_id] = obj
+        self._resident.pop(obj_id, None)
+        self._locations.pop(obj_id, None)
+
+    def _evict(self):
+        """Drop the least recently used objects beyond the capacity
+        """
+        while len(self._resident) > self.capacity:
+            obj_id, obj = self._resident.popitem(last=False)
+            if obj.__dict__.get('_dirty'):
+                # Changed but not saved yet: keep the change
+                self._pin(obj_id, obj)
+            else:
+                self.evictions += 1
+
+    def peek(self, obj_id: str) -> TypeVar('Base'):
+        """Object of an id if it is in memory, without faulting it in
+        """
+        obj = self._pinned.get(obj_id)
+        if obj is None:
+            obj = self._resident.get(obj_id)
+        return obj
+
+    def get(self, obj_id: str, default=None) -> TypeVar('Base'):
+        """Object of an id, faulted in from the class file if needed
+
+        Hits take no lock, each dict operation being atomic: a mutex
+        taken on every lookup would make them queue behind one another.
+        """
+        obj = self._pinned.get(obj_id)
+        if obj is None:
+            obj = self._resident.get(obj_id)
+            if obj is not None:
+                try:
+                    self._resident.move_to_end(obj_id)
+                except KeyError:
+                    # Evicted or pinned meanwhile
+                    pass
+        if obj is not None:
+            self.hits += 1
+            return obj
+        with self._lock:
+            obj = self.peek(obj_id)
+            if obj is not None:
+                self.hits += 1
+                return obj
+            location = self._locations.get(obj_id)
+            if location is None:
+                return default
+            self.misses += 1
+            obj = self._resident[obj_id] = self._load(location)
+            self._evict()
+            return obj
+
+    def __getitem__(self, obj_id: str) -> TypeVar('Base'):
+        """Object of an id, or KeyError
+        """
+        obj = self.get(obj_id)
+        if obj is None:
+            raise KeyError(obj_id)
+        return obj
+
+    def __setitem__(self, obj_id: str, obj: TypeVar('Base')):
+        """Store a saved object, which is pinned
+        """
+        with self._lock:
+            self._pin(obj_id, obj)
+
+    def pop(self, obj_id: str, default=None) -> TypeVar('Base'):
+        """Remove the object of an id and return it
+        """
+        with self._lock:
+            obj = self.get(obj_id)
+            if obj is None:
+                return default
+            self._pinned.pop(obj_id, None)
+            self._resident.pop(obj_id, None)
+            self._locations.pop(obj_id, None)
+            return obj
+
+    def __contains__(self, obj_id: str) -> bool:
+        """Whether an id has an object
+        """
+        return obj_id in self._pinned or obj_id in self._locations
+
+    def __len__(self) -> int:
+        """Number of objects, in memory or not
+        """
+        return len(self._pinned) + len(self._locations)
+
+    def items(self) -> Iterator[Tuple[str, TypeVar('Base')]]:
+        """Every (id, object) pair, reading without caching the objects
+        not in memory, so that a scan does not flush the cache
+
+        The class file is read sequentially, through a large buffer, as
+        it was when the iteration started.
+        """
+        with self._lock:
+            obj_ids = list(self._pinned) + list(self._locations)
+            locations = self._locations
+            # Kept open even if a snapshot replaces the file meanwhile
+            fd = None if self._fd is None else os.dup(self._fd)
+        reader = snapshot.Reader(fd)
+        try:
+            for obj_id in obj_ids:
+                obj = self.peek(obj_id)
+                if obj is None:
+                    location = locations.get(obj_id)
+                    if location is None:
+                        continue
+                    obj = self.cls._restore(
+                        fast_json.loads(reader.read(location)))
+                yield obj_id, obj
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def values(self) -> Iterator[TypeVar('Base')]:
+        """Every object, see `items`
+        """
+        return (obj for _, obj in self.items())
+
+    def write(self, file_path: str):
+        """Write every object to the class file, with the class lock held
+
+        Objects in memory are serialized, the others copied as is from
+        the previous file; all of them are then clean and evictable.
+        """
+        with self._lock:
+            previous = snapshot.Reader(self._fd)
+            # The objects written from memory: hits reorder the resident
+            # ones without locking, so they must not be iterated over
+            written = []
+
+            def records():
+                # Locations are kept in file order
+                for obj_id in list(self._pinned) + list(self._locations):
+                    obj = self.peek(obj_id)
+                    if obj is not None:
+                        written.append(obj)
+                        yield obj_id, obj.to_json_str(True)
+                    else:
+                        yield obj_id, previous.read(self._locations[obj_id])
+
+            locations = snapshot.write(file_path, records(), locate=True)
+            if self._fd is not None:
+                os.close(self._fd)
+            fd = os.open(file_path, os.O_RDONLY)
+            self._fd = fd
+            self._locations = locations
+            self._resident.update(self._pinned)
+            self._pinned = {}
+            for obj in written:
+                obj.__dict__['_dirty'] = set()
+            self._evict()
+
+    def stats(self) -> dict:
+        """Hit, miss and eviction counts, and the objects in memory
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'resident': len(self._resident),
+                    'pinned': len(self._pinned)}
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Fast JSON module
+
+Encodes with orjson when it is installed and falls back to the standard
+library otherwise. Both paths produce the same text as
+`json.dumps(obj, separators=(',', ':'))`: output that orjson would write
+as non-ASCII UTF-8, or that it cannot encode, goes through the standard
+library. Floats needing an exponent are the one exception, and none of
+the models hold floats.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj, sort_keys: bool = False, default=None) -> str:
+    """Encode an object as compact, ASCII-only JSON
+
+    `default` is called, as by `json.dumps`, for objects that are not
+    natively serializable, including dates and dataclasses.
+    """
+    if orjson is not None:
+        option = orjson.OPT_PASSTHROUGH_DATETIME | \
+            orjson.OPT_PASSTHROUGH_DATACLASS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            data = orjson.dumps(obj, default=default, option=option)
+        except TypeError:
+            pass
+        else:
+            if data.isascii():
+                return data.decode()
+    return json.dumps(obj, sort_keys=sort_keys, separators=(',', ':'),
+                      default=default)
+
+
+def loads(data):
+    """Decode a JSON document given as str or bytes
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Journal module
+
+Append-only change log of the JSON model store, replayed on top of the
+class snapshot at load time: saves only append the objects, or the
+attributes, that changed. It also lets the worker processes of a
+pre-fork server share the store: writers append under an exclusive
+file lock, readers replay whatever was appended since they last looked.
+"""
+import fcntl
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+from models import fast_json
+
+
+MAX_BYTES = int(os.getenv('MODEL_JOURNAL_MAX_BYTES', str(1 << 20)))
+COMPACT_RATIO = float(os.getenv('MODEL_JOURNAL_COMPACT_RATIO', '0.5'))
+# Inode, header and read offset of the journal of each class
+_positions = {}
+HEADER_SIZE = 34
+# Inode standing for a journal missing when last read
+_NO_JOURNAL = 0
+# Classes whose lock each thread holds
+_held = threading.local()
+
+
+def _header() -> bytes:
+    """First line of a new journal, telling it apart from the others
+
+    The inode of a replaced journal may be reused by the next one, so
+    that readers cannot rely on inodes alone.
+    """
+    return '#{}\n'.format(uuid.uuid4().hex).encode()
+
+
+def journal_path(s_class: str) -> str:
+    """Journal file of a class
+    """
+    return ".db_{}.journal".format(s_class)
+
+
+@contextmanager
+def locked(s_class: str) -> Iterator[None]:
+    """Hold the cross-process write lock of a class
+
+    Re-entrant within a thread: the lock is held through its own file
+    descriptor, which any other one would wait for.
+    """
+    held = _held.__dict__.setdefault('classes', set())
+    if s_class in held:
+        yield
+        return
+    with open(".db_{}.lock".format(s_class), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        held.add(s_class)
+        try:
+            yield
+        finally:
+            held.discard(s_class)
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def reset(s_class: str):
+    """Forget how far the journal of a class was read
+    """
+    _positions.pop(s_class, None)
+
+
+def has_new(s_class: str) -> bool:
+    """Whether the journal of a class changed since the last read
+    """
+    inode, _, offset = _positions.get(s_class, (None, None, 0))
+    try:
+        st = os.stat(journal_path(s_class))
+    except FileNotFoundError:
+        return False
+    return st.st_ino != inode or st.st_size != offset
+
+
+def _lines(chunk: bytes) -> List[dict]:
+    """Entries of the complete lines of a chunk of journal
+    """
+    # A writer may be halfway through a line: stop at the last newline
+    end = chunk.rfind(b'\n') + 1
+    return [fast_json.loads(line) for line in chunk[:end].splitlines()
+            if not line.startswith(b'#')]
+
+
+def read_new(s_class: str) -> Tuple[bool, List[dict]]:
+    """Entries appended since the last read
+
+    Returns whether the journal was rotated in the meantime, in which
+    case the snapshot must be reloaded before applying the entries.
+    """
+    file_path = journal_path(s_class)
+    inode, header, offset = _positions.get(s_class, (None, None, 0))
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        # The first journal to appear may follow a new snapshot
+        _positions.setdefault(s_class, (_NO_JOURNAL, None, 0))
+        return False, []
+    if st.st_ino == inode and st.st_size == offset:
+        return False, []
+    try:
+        f = open(file_path, 'rb')
+    except FileNotFoundError:
+        _positions.setdefault(s_class, (_NO_JOURNAL, None, 0))
+        return False, []
+    with f:
+        st = os.fstat(f.fileno())
+        head = os.pread(f.fileno(), HEADER_SIZE, 0)
+        if len(head) < HEADER_SIZE:
+            # Still being written by its creator
+            return False, []
+        rotated = (st.st_ino, head) != (inode, header)
+        if rotated:
+            offset = 0
+        f.seek(offset)
+        chunk = f.read(st.st_size - offset)
+    end = chunk.rfind(b'\n') + 1
+    _positions[s_class] = (st.st_ino, head, offset + end)
+    return rotated and inode is not None, _lines(chunk)
+
+
+def append(s_class: str, *entries: dict) -> int:
+    """Append entries, with the lock held, and return the journal size
+    """
+    lines = ''.join(fast_json.dumps(entry) + '\n' for entry in entries)
+    with open(journal_path(s_class), 'a+b') as f:
+        data = lines.encode()
+        if f.tell() == 0:
+            data = _header() + data
+        f.write(data)
+        f.flush()
+        st = os.fstat(f.fileno())
+        head = os.pread(f.fileno(), HEADER_SIZE, 0)
+    _positions[s_class] = (st.st_ino, head, st.st_size)
+    return st.st_size
+
+
+def read_all(s_class: str) -> List[dict]:
+    """Every complete entry of the journal of a class
+    """
+    try:
+        with open(journal_path(s_class), 'rb') as f:
+            return _lines(f.read())
+    except FileNotFoundError:
+        return []
+
+
+def apply(objs_json: dict, entries: List[dict]):
+    """Apply journal entries to serialized objects, by id
+    """
+    for entry in entries:
+        if entry['op'] == 'save':
+            objs_json[entry['obj']['id']] = entry['obj']
+        elif entry['op'] == 'update':
+            if entry['id'] in objs_json:
+                objs_json[entry['id']].update(entry['fields'])
+        else:
+            objs_json.pop(entry['id'], None)
+
+
+def rotate(s_class: str):
+    """Replace the journal by an empty one, with the lock held
+
+    Must only be called once a snapshot containing every entry has been
+    written.
+    """
+    file_path = journal_path(s_class)
+    tmp_path = "{}.tmp".format(file_path)
+    header = _header()
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        st = os.fstat(f.fileno())
+    os.replace(tmp_path, file_path)
+    _positions[s_class] = (st.st_ino, header, len(header))
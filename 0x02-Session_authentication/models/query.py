@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Query module
+
+Search predicates: a key `attr` matches values equal to the given one,
+and `attr__<op>` applies one of OPERATORS, for instance
+`{'created_at__gte': t, 'email__startswith': 'ops@'}`. Values that
+cannot be compared with the operand, such as None, never match a range
+or prefix predicate.
+"""
+from typing import List, Optional, Tuple
+
+OPERATORS = ('gt', 'gte', 'lt', 'lte', 'startswith')
+
+
+def parse(attributes: dict) -> List[Tuple[str, str, object]]:
+    """Split search attributes into (attribute, operator, operand)
+
+    The operator of an equality is 'eq'.
+    """
+    predicates = []
+    for key, value in attributes.items():
+        attr, _, op = key.rpartition('__')
+        if attr and op in OPERATORS:
+            predicates.append((attr, op, value))
+        else:
+            predicates.append((key, 'eq', value))
+    return predicates
+
+
+def prefix_end(prefix: str) -> Optional[str]:
+    """Smallest string greater than every string starting with a prefix
+
+    None when there is no such string.
+    """
+    for i in range(len(prefix) - 1, -1, -1):
+        if ord(prefix[i]) < 0x10FFFF:
+            return prefix[:i] + chr(ord(prefix[i]) + 1)
+    return None
+
+
+def match(value, op: str, operand) -> bool:
+    """Whether a value satisfies a predicate
+    """
+    if op == 'eq':
+        return value == operand
+    try:
+        if op == 'startswith':
+            return isinstance(value, str) and value.startswith(operand)
+        if op == 'gt':
+            return value > operand
+        if op == 'gte':
+            return value >= operand
+        if op == 'lt':
+            return value < operand
+        return value <= operand
+    except TypeError:
+        return False
+
+
+def matches(obj, predicates: List[Tuple[str, str, object]]) -> bool:
+    """Whether an object satisfies every predicate
+    """
+    for attr, op, operand in predicates:
+        if not match(getattr(obj, attr), op, operand):
+            return False
+    return True
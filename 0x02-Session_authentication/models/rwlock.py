@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Reader-writer lock module
+
+Lets any number of threads read the objects of a class at once, while a
+thread changing them has them to itself. Waiting writers take
+precedence over new readers so that a steady flow of reads cannot
+starve them. A writer may read, and write again, without deadlocking;
+a reader must not start writing, as two readers doing so would wait for
+each other forever.
+"""
+import threading
+
+
+class _Side():
+    """Context manager acquiring one side of a lock
+    """
+    __slots__ = ('acquire', 'release')
+
+    def __init__(self, acquire, release):
+        """Initialize from the acquire and release functions
+        """
+        self.acquire = acquire
+        self.release = release
+
+    def __enter__(self):
+        """Acquire
+        """
+        self.acquire()
+
+    def __exit__(self, *exc_info):
+        """Release
+        """
+        self.release()
+
+
+class ReadWriteLock():
+    """Writer-preferring reader-writer lock, re-entrant on both sides
+
+    Used as `with lock.read:` or `with lock.write:`. While no writer
+    holds or waits for the lock, readers only register in a set, whose
+    updates are atomic: taking a mutex on every read would make readers
+    queue on it, and on the GIL, behind whichever of them was preempted
+    while holding it.
+    """
+
+    def __init__(self):
+        """Initialize an unlocked lock
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = set()
+        self._writer = None
+        self._writes = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+        self.read = _Side(self.acquire_read, self.release_read)
+        self.write = _Side(self.acquire_write, self.release_write)
+
+    def acquire_read(self):
+        """Wait until no writer holds or waits for the lock, then read
+
+        A thread already reading, or writing, goes on without waiting.
+        """
+        local = self._local
+        depth = getattr(local, 'reads', 0)
+        me = threading.get_ident()
+        if depth or self._writer == me:
+            local.reads = depth + 1
+            return
+        if self._writer is None and not self._waiting_writers:
+            self._readers.add(me)
+            # Unless a writer came in meanwhile, it will wait for us
+            if self._writer is None and not self._waiting_writers:
+                local.reads = 1
+                return
+            self._leave(me)
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers.add(me)
+        local.reads = 1
+
+    def _leave(self, me: int):
+        """Unregister a reader, waking up the writers waiting for it
+        """
+        self._readers.discard(me)
+        if self._waiting_writers:
+            with self._cond:
+                self._cond.notify_all()
+
+    def release_read(self):
+        """Stop reading
+        """
+        local = self._local
+        local.reads -= 1
+        me = threading.get_ident()
+        if local.reads or self._writer == me:
+            return
+        self._leave(me)
+
+    def acquire_write(self):
+        """Wait until nobody else holds the lock, then write
+        """
+        me = threading.get_ident()
+        if self._writer == me:
+            self._writes += 1
+            return
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            # Owned before it stops waiting, so that no lock-free reader
+            # sees neither
+            self._writer = me
+            self._writes = 1
+            self._waiting_writers -= 1
+
+    def release_write(self):
+        """Stop writing
+        """
+        self._writes -= 1
+        if self._writes:
+            return
+        with self._cond:
+            self._writer = None
+            self._cond.notify_all()
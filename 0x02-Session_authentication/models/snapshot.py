@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Snapshot module
+
+Reads and writes the class files of the JSON model store. A class file
+holds the JSON object of the serialized objects by id, one member per
+line, so that each object can be located by its byte offset and read
+back alone. A location packs the offset and the length of an object in
+one integer, which keeps an index of millions of them small.
+"""
+import json
+import os
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple, Union
+
+from models import fast_json
+
+# Large buffers keep the I/O calls, which release the GIL, few: under
+# contention, each one waits for the GIL to be handed back
+BUFFER_SIZE = 1 << 20
+_decoder = json.JSONDecoder()
+
+
+def write(file_path: str, records: Iterable[Tuple[str, Union[str, bytes]]],
+          locate: bool = False) -> Optional[dict]:
+    """Atomically write (id, serialized object) pairs as a class file
+
+    With `locate`, returns the location of each object by id.
+    """
+    locations = {} if locate else None
+    tmp_path = "{}.tmp".format(file_path)
+    with open(tmp_path, 'wb', buffering=BUFFER_SIZE) as f:
+        f.write(b'{')
+        offset, separator = 1, b'\n'
+        for obj_id, data in records:
+            if isinstance(data, str):
+                data = data.encode()
+            head = separator + fast_json.dumps(obj_id).encode() + b':'
+            f.write(head)
+            f.write(data)
+            offset += len(head)
+            if locate:
+                locations[obj_id] = offset << 32 | len(data)
+            offset += len(data)
+            separator = b',\n'
+        f.write(b'\n}')
+        # Durable before it replaces the previous file, so that a crash
+        # leaves one of them whole
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+    return locations
+
+
+def is_scannable(f: BinaryIO) -> bool:
+    """Whether a class file has one member per line
+
+    Files written before that format are single-line JSON objects.
+    """
+    f.seek(0)
+    scannable = f.read(2) == b'{\n'
+    f.seek(0)
+    return scannable
+
+
+def scan(f: BinaryIO) -> Iterator[Tuple[str, int, bytes]]:
+    """(id, location, serialized object) of each object of a class file
+    """
+    offset = 0
+    for line in f:
+        start = offset
+        offset += len(line)
+        line = line.rstrip(b',\n')
+        if line in (b'{', b'}', b''):
+            continue
+        # Ids are encoded as ASCII, so characters are bytes
+        obj_id, end = _decoder.raw_decode(line.decode())
+        data = line[end + 1:]
+        yield obj_id, (start + end + 1) << 32 | len(data), data
+
+
+def read(fd: int, location: int) -> bytes:
+    """Serialized object at a location of an open class file
+    """
+    return os.pread(fd, location & 0xFFFFFFFF, location >> 32)
+
+
+class Reader():
+    """Reads the objects of an open class file in file order, by chunks
+
+    Reads use `pread`, which leaves the file offset alone, so that
+    readers of duplicates of the same descriptor do not interfere.
+    """
+
+    def __init__(self, fd: int):
+        """Initialize a reader of a file descriptor
+        """
+        self.fd = fd
+        self._start = 0
+        self._chunk = b''
+
+    def read(self, location: int) -> bytes:
+        """Serialized object at a location
+        """
+        offset, length = location >> 32, location & 0xFFFFFFFF
+        start = offset - self._start
+        if start < 0 or start + length > len(self._chunk):
+            self._chunk = os.pread(self.fd, max(BUFFER_SIZE, length), offset)
+            self._start, start = offset, 0
+        return self._chunk[start:start + length]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Sorted index module
+
+Keeps the values of one attribute sorted, next to the ids of their
+objects, so that equality, range and prefix predicates are answered by
+bisection instead of a scan.
+"""
+from bisect import bisect_left, bisect_right
+from typing import List
+
+from models import query
+
+
+class SortedIndex():
+    """Object ids sorted by the value of one attribute
+
+    Only values of `kind` are indexed; predicates on other values must
+    fall back to a scan. The index is not synchronized: the models
+    update it under the write side of their class lock and look it up
+    under the read side.
+    """
+
+    def __init__(self, kind: type, entries=()):
+        """Initialize from (value, id) pairs
+        """
+        self.kind = kind
+        pairs = sorted((value, obj_id) for value, obj_id in entries
+                       if isinstance(value, kind))
+        self._values = [value for value, _ in pairs]
+        self._ids = [obj_id for _, obj_id in pairs]
+
+    def __len__(self) -> int:
+        """Number of indexed objects
+        """
+        return len(self._ids)
+
+    def add(self, value, obj_id: str):
+        """Index the value of an object
+        """
+        if not isinstance(value, self.kind):
+            return
+        i = bisect_right(self._values, value)
+        self._values.insert(i, value)
+        self._ids.insert(i, obj_id)
+
+    def discard(self, value, obj_id: str):
+        """Unindex the value of an object, if indexed
+        """
+        if not isinstance(value, self.kind):
+            return
+        lo = bisect_left(self._values, value)
+        hi = bisect_right(self._values, value, lo)
+        for i in range(lo, hi):
+            if self._ids[i] == obj_id:
+                del self._values[i]
+                del self._ids[i]
+                return
+
+    def supports(self, op: str, operand) -> bool:
+        """Whether a predicate can be answered from the index
+        """
+        if op == 'startswith':
+            return self.kind is str and isinstance(operand, str)
+        return isinstance(operand, self.kind)
+
+    def lookup(self, predicates: list) -> List[str]:
+        """Ids of the objects whose value may satisfy every predicate
+
+        `predicates` are (operator, operand) pairs, all supported.
+        """
+        values = self._values
+        lo, hi = 0, len(values)
+        for op, operand in predicates:
+            if op == 'eq':
+                lo = max(lo, bisect_left(values, operand, lo, hi))
+                hi = min(hi, bisect_right(values, operand, lo, hi))
+            elif op == 'gt':
+                lo = max(lo, bisect_right(values, operand, lo, hi))
+            elif op == 'gte':
+                lo = max(lo, bisect_left(values, operand, lo, hi))
+            elif op == 'lt':
+                hi = min(hi, bisect_left(values, operand, lo, hi))
+            elif op == 'lte':
+                hi = min(hi, bisect_right(values, operand, lo, hi))
+            else:
+                lo = max(lo, bisect_left(values, operand, lo, hi))
+                end = query.prefix_end(operand)
+                if end is not None:
+                    hi = min(hi, bisect_left(values, end, lo, hi))
+            if lo >= hi:
+                return []
+        return self._ids[lo:hi]
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""SQLite storage module
+
+Stores each model class in its own table: the serialized object in a
+JSON `data` column plus one indexed column per attribute listed in the
+class `INDEXED_ATTRIBUTES`, so equality searches on them use an index.
+"""
+import sqlite3
+import threading
+from os import getenv, path
+from typing import List, TypeVar
+
+from models import fast_json, journal, query
+
+
+DB_PATH = getenv('MODEL_SQLITE_PATH', '.db.sqlite3')
+_local = threading.local()
+_tables = set()
+_tables_lock = threading.Lock()
+
+
+def _connection() -> sqlite3.Connection:
+    """Connection of the current thread
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _local.conn = conn
+    return conn
+
+
+def _table(cls: type) -> str:
+    """Name of the table of a class, created on first use
+
+    A new table is seeded with the content of the class JSON file and
+    journal, if any, to migrate from the JSON store.
+    """
+    name = cls.__name__
+    if name in _tables:
+        return name
+    with _tables_lock:
+        if name in _tables:
+            return name
+        conn = _connection()
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (name,)).fetchone()
+        with conn:
+            columns = ''.join(', "{}"'.format(attr)
+                              for attr in cls.INDEXED_ATTRIBUTES)
+            conn.execute('CREATE TABLE IF NOT EXISTS "{}" '
+                         '(id TEXT PRIMARY KEY, data TEXT NOT NULL{})'
+                         .format(name, columns))
+            for attr in cls.INDEXED_ATTRIBUTES:
+                conn.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}" '
+                             'ON "{0}" ("{1}")'.format(name, attr))
+        json_path = ".db_{}.json".format(name)
+        if not exists:
+            objs_json = {}
+            if path.exists(json_path):
+                with open(json_path, 'r') as f:
+                    objs_json = fast_json.loads(f.read())
+            journal.apply(objs_json, journal.read_all(name))
+            if objs_json:
+                _insert(conn, cls, name, objs_json.values())
+        _tables.add(name)
+    return name
+
+
+def _insert(conn: sqlite3.Connection, cls: type, name: str, objs_json):
+    """Insert or replace serialized objects
+    """
+    attrs = ('id', 'data') + tuple(cls.INDEXED_ATTRIBUTES)
+    sql = 'INSERT OR REPLACE INTO "{}" ({}) VALUES ({})'.format(
+        name, ', '.join('"{}"'.format(a) for a in attrs),
+        ', '.join('?' * len(attrs)))
+    rows = [(obj_json['id'], fast_json.dumps(obj_json)) +
+            tuple(obj_json.get(a) for a in cls.INDEXED_ATTRIBUTES)
+            for obj_json in objs_json]
+    with conn:
+        conn.executemany(sql, rows)
+
+
+def load(cls: type):
+    """Make sure the table of a class exists
+    """
+    _table(cls)
+
+
+def save(obj) -> None:
+    """Insert or update one object
+    """
+    cls = obj.__class__
+    _insert(_connection(), cls, _table(cls), [obj.to_json(True)])
+
+
+def save_many(cls: type, objs: list, stored_only: bool = False) -> int:
+    """Insert or update several objects in one transaction
+
+    With `stored_only`, rows deleted in the meantime are not inserted
+    again. Returns the number of objects written.
+    """
+    conn, name = _connection(), _table(cls)
+    objs_json = [obj.to_json(True) for obj in objs]
+    if not stored_only:
+        _insert(conn, cls, name, objs_json)
+        return len(objs_json)
+    attrs = ('data',) + tuple(cls.INDEXED_ATTRIBUTES)
+    sql = 'UPDATE "{}" SET {} WHERE id = ?'.format(
+        name, ', '.join('"{}" = ?'.format(a) for a in attrs))
+    rows = [(fast_json.dumps(obj_json),) +
+            tuple(obj_json.get(a) for a in cls.INDEXED_ATTRIBUTES) +
+            (obj_json['id'],) for obj_json in objs_json]
+    with conn:
+        return conn.executemany(sql, rows).rowcount
+
+
+def remove(obj) -> None:
+    """Delete one object
+    """
+    conn = _connection()
+    with conn:
+        conn.execute('DELETE FROM "{}" WHERE id = ?'.format(
+            _table(obj.__class__)), (obj.id,))
+
+
+def count(cls: type) -> int:
+    """Number of objects of a class
+    """
+    sql = 'SELECT COUNT(*) FROM "{}"'.format(_table(cls))
+    return _connection().execute(sql).fetchone()[0]
+
+
+def get(cls: type, id: str) -> TypeVar('Base'):
+    """Object of a class by id
+    """
+    sql = 'SELECT data FROM "{}" WHERE id = ?'.format(_table(cls))
+    row = _connection().execute(sql, (id,)).fetchone()
+    if row is None:
+        return None
+    return cls(**fast_json.loads(row[0]))
+
+
+def search(cls: type, attributes: dict) -> List[TypeVar('Base')]:
+    """Objects of a class matching every predicate
+
+    Predicates on indexed attributes are matched in SQL, where string
+    operands allow it, the others on the loaded objects.
+    """
+    clauses, params = [], []
+    predicates = query.parse(attributes)
+    for attr, op, operand in predicates:
+        if attr != 'id' and attr not in cls.INDEXED_ATTRIBUTES:
+            continue
+        if op == 'eq':
+            clauses.append('"{}" IS ?'.format(attr))
+            params.append(operand)
+        elif not isinstance(operand, str):
+            continue
+        elif op == 'startswith':
+            clauses.append('"{}" >= ?'.format(attr))
+            params.append(operand)
+            end = query.prefix_end(operand)
+            if end is not None:
+                clauses.append('"{}" < ?'.format(attr))
+                params.append(end)
+        else:
+            sign = {'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}[op]
+            clauses.append('"{}" {} ?'.format(attr, sign))
+            params.append(operand)
+    sql = 'SELECT data FROM "{}"'.format(_table(cls))
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    result = []
+    for row in _connection().execute(sql, params):
+        obj = cls(**fast_json.loads(row[0]))
+        if query.matches(obj, predicates):
+            result.append(obj)
+    return result
@@ -2,12 +2,17 @@
 """User module.
 """
 import hashlib
+from datetime import datetime
 from models.base import Base
 
 
 class User(Base):
     """User class
     """
+    INDEXED_ATTRIBUTES = ('email',)
+    FILTERED_ATTRIBUTES = ('email',)
+    SORTED_ATTRIBUTES = {'email': str, 'created_at': datetime,
+                         'updated_at': datetime}
 
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize user
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 """Module for user session management.
 """
-from models.base import Base
+from models.base import Base, parse_timestamp
 
 class UserSession(Base):
     """Class for handling user sessions.
     """
+    INDEXED_ATTRIBUTES = ('user_id', 'session_id')
+    SORTED_ATTRIBUTES = {'user_id': str, 'session_id': str}
 
     def __init__(self, *args: list, **kwargs: dict):
         """
@@ -18,4 +20,9 @@ class UserSession(Base):
         super().__init__(*args, **kwargs)
         self.user_id = kwargs.get('user_id')
         self.session_id = kwargs.get('session_id')
+        # Last activity persisted in sliding expiration mode, if any
+        last_seen = kwargs.get('last_seen')
+        if isinstance(last_seen, str):
+            last_seen = parse_timestamp(last_seen)
+        self.last_seen = last_seen
 
@@ -0,0 +1,5 @@
+#!/usr/bin/env python3
+"""Tests of the Session authentication API
+
+Run from the project directory: python -m pytest tests
+"""
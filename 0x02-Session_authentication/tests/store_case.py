@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Store test case module
+"""
+import os
+import tempfile
+import unittest
+
+from models import base, journal
+
+
+class StoreTestCase(unittest.TestCase):
+    """Runs each test on an empty model store, in a temporary directory
+    """
+
+    def setUp(self):
+        """Empty the store and move to a new directory
+        """
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.addCleanup(self._restore)
+        self._reset_store()
+
+    def _restore(self):
+        """Empty the store and go back to the initial directory
+        """
+        self._reset_store()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    @staticmethod
+    def _reset_store():
+        """Forget every loaded object
+        """
+        for registry in (base.DATA, base.FILTERS, base.INDEXES, base.LOCKS):
+            registry.clear()
+        base.LOADED.clear()
+        journal._positions.clear()
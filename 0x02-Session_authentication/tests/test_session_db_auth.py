@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Tests of the batched last-seen updates of session_db_auth
+"""
+import os
+from unittest import mock
+
+from api.v1.auth.session_db_auth import SessionDBAuth
+from models import base
+from models.user_session import UserSession
+from tests.store_case import StoreTestCase
+
+
+class TestFlushLastSeen(StoreTestCase):
+    """Sliding sessions whose last use is always pending
+    """
+
+    def setUp(self):
+        """Use the JSON store and sliding sessions
+        """
+        super().setUp()
+        patcher = mock.patch.dict(os.environ, {
+            'SESSION_DURATION': '60', 'SESSION_SLIDING': '1',
+            'SESSION_LAST_SEEN_GRANULARITY': '0',
+            'SESSION_LAST_SEEN_FLUSH_INTERVAL': '3600'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name, value in (('SHARED', False), ('SQLITE', False),
+                            ('CACHE_SIZE', 0)):
+            patcher = mock.patch.object(base, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.auth = SessionDBAuth()
+
+    def test_flush_writes_pending_sessions(self):
+        """A used session gets its last use persisted
+        """
+        session_id = self.auth.create_session('user-1')
+        self.assertEqual(self.auth.user_id_for_session_id(session_id),
+                         'user-1')
+        self.assertEqual(self.auth.flush_last_seen(), 1)
+        session = UserSession.search({'session_id': session_id})[0]
+        self.assertIsNotNone(session.last_seen)
+
+    def test_flush_does_not_revive_a_removed_session(self):
+        """A session removed after the flush took its pending updates is
+        not stored again
+        """
+        session_id = self.auth.create_session('user-1')
+        self.auth.user_id_for_session_id(session_id)
+        session = UserSession.search({'session_id': session_id})[0]
+        save_many = UserSession.save_many
+
+        def remove_then_save(objs, **kwargs):
+            session.remove()
+            return save_many(objs, **kwargs)
+
+        with mock.patch.object(UserSession, 'save_many', remove_then_save):
+            self.assertEqual(self.auth.flush_last_seen(), 0)
+        self.assertIsNone(UserSession.get(session.id))
+        base.DATA.clear()
+        base.LOADED.clear()
+        self.assertEqual(UserSession.search({'session_id': session_id}), [])
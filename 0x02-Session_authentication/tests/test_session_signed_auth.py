@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Tests of the signed session provider
+"""
+import os
+import unittest
+from unittest import mock
+
+from api.v1.auth.session_signed_auth import SessionSignedAuth
+from models import base
+
+
+class TestSessionSignedAuth(unittest.TestCase):
+    """Tokens signed with a test key, in a single process
+    """
+
+    def setUp(self):
+        """Configure a signing key and the single-process store
+        """
+        patcher = mock.patch.dict(os.environ, {
+            'SESSION_SIGNING_KEYS': 'test:test-secret',
+            'SESSION_NAME': '_my_session_id',
+            'SESSION_DURATION': '60'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(base, 'SHARED', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.auth = SessionSignedAuth()
+
+    def request(self, session_id: str) -> mock.Mock:
+        """A request carrying a session cookie
+        """
+        return mock.Mock(cookies={'_my_session_id': session_id})
+
+    def test_logout_revokes_the_token(self):
+        """A destroyed session is rejected, the others still pass
+        """
+        token = self.auth.create_session('user-1')
+        other = self.auth.create_session('user-1')
+        self.assertEqual(self.auth.user_id_for_session_id(token), 'user-1')
+        self.assertTrue(self.auth.destroy_session(self.request(token)))
+        self.assertIsNone(self.auth.user_id_for_session_id(token))
+        self.assertEqual(self.auth.user_id_for_session_id(other), 'user-1')
+
+    def test_logout_everywhere(self):
+        """Every token issued to a user so far is rejected
+        """
+        tokens = [self.auth.create_session('user-1') for _ in range(3)]
+        self.auth.destroy_all_sessions('user-1')
+        for token in tokens:
+            self.assertIsNone(self.auth.user_id_for_session_id(token))
+
+    def test_refuses_worker_processes(self):
+        """Revocations would not reach the other workers of a pre-fork
+        server
+        """
+        with mock.patch.object(base, 'SHARED', True):
+            with self.assertRaises(ValueError):
+                SessionSignedAuth()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Tests of the store shared by the processes of a pre-fork server
+"""
+import gc
+import multiprocessing
+import os
+import subprocess
+import sys
+from unittest import mock
+
+from models import base, journal
+from models.base import DATA, LOADED
+from models.user import User
+from tests.store_case import StoreTestCase
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def private_bytes() -> int:
+    """Memory of the process not shared with any other one
+    """
+    total = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+def rss_bytes() -> int:
+    """Resident memory of the process
+    """
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Rss:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class TestSharedStore(StoreTestCase):
+    """Tests of MODEL_STORE_SHARED=1
+    """
+
+    def setUp(self):
+        """Switch to the shared mode, compacting the journal often
+        """
+        super().setUp()
+        for name, value in (('SHARED', True), ('SQLITE', False),
+                            ('CACHE_SIZE', 0)):
+            patcher = mock.patch.object(base, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.multiple(journal, MAX_BYTES=4096,
+                                      COMPACT_RATIO=0.5)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fork = multiprocessing.get_context('fork')
+
+    def test_workers_see_each_other_writes(self):
+        """Workers forked after the load see the saves and removes of
+        all the others, across compactions
+        """
+        User.count()
+        workers, barrier = 4, self.fork.Barrier(4)
+        results = self.fork.Queue()
+
+        def worker(n):
+            users = []
+            for i in range(50):
+                user = User(email='{}-{}@test.io'.format(n, i))
+                user.save()
+                users.append(user)
+            for user in users[:10]:
+                user.first_name = 'renamed'
+                user.save()
+            for user in users[-10:]:
+                user.remove()
+            barrier.wait()
+            results.put({user.id: user.first_name for user in User.all()})
+
+        processes = [self.fork.Process(target=worker, args=(n,))
+                     for n in range(workers)]
+        for process in processes:
+            process.start()
+        seen = [results.get(timeout=60) for _ in processes]
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        expected = {user.id: user.first_name for user in User.all()}
+        self.assertEqual(len(expected), workers * 40)
+        self.assertEqual(
+            sum(name == 'renamed' for name in expected.values()),
+            workers * 10)
+        for view in seen:
+            self.assertEqual(view, expected)
+
+    def test_load_is_not_split_by_a_compaction(self):
+        """A compaction by another process cannot come between the reads
+        of the snapshot and of the journal by a load
+        """
+        for i in range(20):
+            User(email='{}@test.io'.format(i)).save()
+        DATA.clear()
+        LOADED.clear()
+        journal._positions.clear()
+        env = dict(os.environ, PYTHONPATH=PROJECT_DIR,
+                   MODEL_STORE_SHARED='1', MODEL_JOURNAL_MAX_BYTES='0',
+                   MODEL_JOURNAL_COMPACT_RATIO='0')
+        compactor = []
+        reset = journal.reset
+
+        def reset_then_compact(s_class):
+            # Another process saves, which compacts the journal
+            compactor.append(subprocess.Popen(
+                [sys.executable, '-c',
+                 'from models.user import User; '
+                 'User(email="late@test.io").save()'], env=env))
+            try:
+                compactor[0].wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                pass
+            reset(s_class)
+
+        with mock.patch.object(journal, 'reset', reset_then_compact):
+            self.assertEqual(User.count(), 20)
+        self.assertEqual(compactor[0].wait(timeout=60), 0)
+        self.assertEqual(User.count(), 21)
+
+    def test_workers_share_the_preloaded_store(self):
+        """Workers searching the store do not copy the objects loaded
+        before the fork
+        """
+        DATA['User'] = {}
+        LOADED.add('User')
+        for i in range(20000):
+            user = User(email='{}@test.io'.format(i))
+            DATA['User'][user.id] = user
+        User.save_to_file()
+        DATA.clear()
+        LOADED.clear()
+        gc.collect()
+        before = rss_bytes()
+        base.preload(User)
+        self.addCleanup(gc.unfreeze)
+        loaded = rss_bytes() - before
+        results = self.fork.Queue()
+
+        def worker():
+            start = private_bytes()
+            for i in range(0, 20000, 100):
+                User.search({'email': '{}@test.io'.format(i)})
+            results.put((start, private_bytes()))
+
+        process = self.fork.Process(target=worker)
+        process.start()
+        start, end = results.get(timeout=60)
+        process.join()
+        self.assertLess(end - start, loaded / 2)
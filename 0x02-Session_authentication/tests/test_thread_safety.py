@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Tests of the model store under a threaded server
+"""
+import random
+import sys
+import threading
+import time
+from unittest import mock
+
+from models import base, journal
+from models.base import DATA, LOADED
+from models.cache import ModelCache
+from models.rwlock import ReadWriteLock
+from models.user import User
+from tests.store_case import StoreTestCase
+
+
+class HandOverLock(ReadWriteLock):
+    """Lets a reader try to get in while a writer stops waiting
+    """
+
+    def __init__(self):
+        """Initialize an unlocked lock and no reader
+        """
+        self.entered = threading.Event()
+        self.reader = None
+        super().__init__()
+
+    @property
+    def _waiting_writers(self) -> int:
+        """Number of waiting writers
+        """
+        return self._waiting
+
+    @_waiting_writers.setter
+    def _waiting_writers(self, value: int):
+        """Set the number of waiting writers, starting a reader when it
+        drops and giving it time to get in
+        """
+        stopped = value < getattr(self, '_waiting', 0)
+        self._waiting = value
+        if stopped and self.reader is None:
+            self.reader = threading.Thread(target=self._read)
+            self.reader.start()
+            self.entered.wait(0.2)
+
+    def _read(self):
+        """Read once
+        """
+        with self.read:
+            self.entered.set()
+
+
+class HitOnChange(dict):
+    """Attributes of an object, calling `hook` once their change set is
+    replaced, as another thread could at that point
+    """
+    hook = None
+
+    def __setitem__(self, key, value):
+        """Set an attribute, then call the hook
+        """
+        super().__setitem__(key, value)
+        if key == '_dirty' and HitOnChange.hook is not None:
+            HitOnChange.hook()
+
+
+class TestReadWriteLock(StoreTestCase):
+    """Tests of the reader-writer lock
+    """
+
+    def test_no_reader_while_a_writer_takes_over(self):
+        """A reader coming while a writer stops waiting waits for it
+        """
+        lock = HandOverLock()
+        lock.acquire_read()
+        writer = threading.Thread(target=lock.acquire_write)
+        writer.start()
+        while not lock._waiting_writers:
+            time.sleep(0.001)
+        # Waking the writer up, which takes the lock
+        lock.release_read()
+        writer.join()
+        self.assertFalse(lock.entered.is_set())
+        lock._writer = threading.get_ident()
+        lock.release_write()
+        lock.reader.join()
+        self.assertTrue(lock.entered.is_set())
+
+    def test_readers_and_writers_exclude_each_other(self):
+        """No reader runs while a writer does, and writers run alone
+        """
+        lock = ReadWriteLock()
+        state = {'readers': 0, 'writers': 0}
+        counter = threading.Lock()
+        errors = []
+        end = time.monotonic() + 0.5
+
+        def reader():
+            while time.monotonic() < end:
+                with lock.read:
+                    with counter:
+                        state['readers'] += 1
+                        if state['writers']:
+                            errors.append('read while writing')
+                    with counter:
+                        state['readers'] -= 1
+
+        def writer():
+            while time.monotonic() < end:
+                with lock.write:
+                    with counter:
+                        state['writers'] += 1
+                        if state['writers'] > 1 or state['readers']:
+                            errors.append('write while busy')
+                    with counter:
+                        state['writers'] -= 1
+
+        threads = [threading.Thread(target=reader) for _ in range(4)] + \
+            [threading.Thread(target=writer) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class TestThreadedStore(StoreTestCase):
+    """Readers and a writer sharing the objects of a class
+    """
+
+    def setUp(self):
+        """Use the JSON store, compacting the journal often, with threads
+        switching often
+        """
+        super().setUp()
+        for name, value in (('SHARED', False), ('SQLITE', False),
+                            ('CACHE_SIZE', 0)):
+            patcher = mock.patch.object(base, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.multiple(journal, MAX_BYTES=16384,
+                                      COMPACT_RATIO=0.5)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    def run_threads(self, seconds: float, readers: int = 4) -> list:
+        """Search and update the users from threads for a while, and
+        return the exceptions raised
+        """
+        ids = [user.id for user in User.all()]
+        errors = []
+        end = time.monotonic() + seconds
+
+        def guarded(func):
+            def run():
+                try:
+                    func()
+                except Exception as e:
+                    errors.append(e)
+            return threading.Thread(target=run)
+
+        def reader():
+            rng = random.Random()
+            n = 0
+            while time.monotonic() < end:
+                n += 1
+                user = User.get(rng.choice(ids))
+                if user is not None:
+                    User.search({'email': user.email})
+                if n % 100 == 0:
+                    User.search({'first_name': 'renamed'})
+
+        def writer():
+            n = 0
+            while time.monotonic() < end:
+                n += 1
+                user = User.get(random.choice(ids))
+                if user is not None:
+                    user.first_name = 'renamed'
+                    user.save()
+                created = User(email='new{}@test.io'.format(n))
+                created.save()
+                if n % 2:
+                    created.remove()
+                if n % 5 == 0:
+                    User.save_to_file()
+
+        threads = [guarded(reader) for _ in range(readers)]
+        threads.append(guarded(writer))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def seed(self, size: int):
+        """Save users, then forget them so that they are loaded again
+        """
+        User.save_many(User(email='{}@test.io'.format(i))
+                       for i in range(size))
+        User.save_to_file()
+        DATA.clear()
+        LOADED.clear()
+
+    def assert_file_matches_memory(self):
+        """The class file, once loaded again, holds the same users
+        """
+        expected = {user.id: user.to_json(True) for user in User.all()}
+        DATA.clear()
+        LOADED.clear()
+        self.assertEqual(
+            {user.id: user.to_json(True) for user in User.all()}, expected)
+
+    def test_dict_store(self):
+        """Every object in memory
+        """
+        self.seed(1000)
+        self.assertEqual(self.run_threads(2), [])
+        self.assert_file_matches_memory()
+
+    def test_model_cache(self):
+        """A model cache smaller than the users, which hits reorder
+        without locking while snapshots rewrite it
+        """
+        with mock.patch.object(base, 'CACHE_SIZE', 500):
+            self.seed(1000)
+            User.count()
+            self.assertIsInstance(DATA['User'], ModelCache)
+            self.assertEqual(self.run_threads(2), [])
+            self.assert_file_matches_memory()
+
+    def test_model_cache_hit_during_snapshot(self):
+        """A hit reordering the cache while a snapshot marks its objects
+        as written does not break the snapshot
+        """
+        with mock.patch.object(base, 'CACHE_SIZE', 10):
+            self.seed(20)
+            User.count()
+            cache = DATA['User']
+            ids = list(cache._locations)
+            for obj_id in ids[:10]:
+                obj = cache.get(obj_id)
+                obj.__dict__ = HitOnChange(obj.__dict__)
+            hits = iter(ids[:10] * 2)
+            patcher = mock.patch.object(HitOnChange, 'hook',
+                                        lambda: cache.get(next(hits)))
+            with patcher:
+                User.save_to_file()
+            self.assertEqual(cache.stats()['resident'], 10)
+            self.assert_file_matches_memory()
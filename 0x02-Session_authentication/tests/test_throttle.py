@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Tests of the login throttle
+"""
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import api.v1.auth.basic_auth as basic_auth
+from api.v1.throttle import LoginThrottle
+from tests.test_users_view import UsersViewTestCase
+
+
+class TestLoginThrottle(UsersViewTestCase):
+    """Basic Auth requests against a fresh throttle
+    """
+
+    def setUp(self):
+        """Use a throttle of its own for each test
+        """
+        super().setUp()
+        self.throttle = LoginThrottle()
+        patcher = mock.patch.object(basic_auth, 'LOGIN_THROTTLE',
+                                    self.throttle)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def me(self, email: str, password: str, ip: str) -> int:
+        """Status of GET /api/v1/users/me sent from an address
+        """
+        return self.client.get(
+            '/api/v1/users/me', headers=self.basic(email, password),
+            environ_base={'REMOTE_ADDR': ip}).status_code
+
+    def test_concurrent_requests_are_not_shed(self):
+        """Valid requests running at once are all served
+        """
+        self.throttle.max_pending = 1
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            statuses = list(executor.map(
+                lambda _: self.me('admin@hbtn.io', 'admin-pwd', '192.0.2.1'),
+                range(64)))
+        self.assertEqual(statuses, [200] * 64)
+
+    def test_email_bucket_is_shared_between_clients(self):
+        """Failures for an email from many addresses exhaust its bucket
+        """
+        for i in range(int(self.throttle.by_email.burst)):
+            self.assertEqual(
+                self.me('admin@hbtn.io', 'guess', '10.0.0.{}'.format(i)),
+                403)
+        self.assertEqual(self.me('admin@hbtn.io', 'admin-pwd', '10.0.1.1'),
+                         429)
+
+    def test_authenticated_client_is_not_locked_out(self):
+        """A client that authenticated before keeps going through
+        """
+        self.assertEqual(self.me('admin@hbtn.io', 'admin-pwd', '192.0.2.1'),
+                         200)
+        for i in range(int(self.throttle.by_email.burst)):
+            self.me('admin@hbtn.io', 'guess', '10.0.0.{}'.format(i))
+        self.assertEqual(self.me('admin@hbtn.io', 'admin-pwd', '192.0.2.1'),
+                         200)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Tests of the /api/v1/users views
+"""
+import base64
+from unittest import mock
+
+import api.v1.app as app_module
+from api.v1.auth.basic_auth import BasicAuth
+from models.user import User
+from tests.store_case import StoreTestCase
+
+
+class UsersViewTestCase(StoreTestCase):
+    """Serves the API with Basic Auth on an empty store
+    """
+
+    def setUp(self):
+        """Create a client and the user it authenticates as
+        """
+        super().setUp()
+        patcher = mock.patch.object(app_module, 'auth', BasicAuth())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app_module.app.test_client(use_cookies=False)
+        self.admin = self.create_user('admin@hbtn.io', 'admin-pwd')
+
+    @staticmethod
+    def create_user(email: str, password: str, **kwargs) -> User:
+        """Save a new user
+        """
+        user = User(email=email, **kwargs)
+        user.password = password
+        user.save()
+        return user
+
+    @staticmethod
+    def basic(email: str, password: str) -> dict:
+        """Headers authenticating as a user
+        """
+        token = base64.b64encode('{}:{}'.format(email, password).encode())
+        return {'Authorization': 'Basic ' + token.decode()}
+
+
+class TestSearchUsers(UsersViewTestCase):
+    """GET /api/v1/users with query parameters
+    """
+
+    def search(self, query: str):
+        """Send a search as the admin
+        """
+        return self.client.get('/api/v1/users?' + query,
+                               headers=self.basic('admin@hbtn.io',
+                                                  'admin-pwd'))
+
+    def test_created_after(self):
+        """A naive bound is read as UTC
+        """
+        self.create_user('old@hbtn.io', 'pwd',
+                         created_at='2020-01-01T00:00:00')
+        response = self.search('created_at__lt=2024-01-01T00:00:00')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['email'] for user in response.get_json()],
+                         ['old@hbtn.io'])
+
+    def test_offset_is_converted_to_utc(self):
+        """A bound with an offset matches like its UTC equivalent
+        """
+        self.create_user('old@hbtn.io', 'pwd',
+                         created_at='2020-01-01T12:00:00')
+        for bound, emails in (('2020-01-01T15:00:00%2B02:00',
+                               ['old@hbtn.io']),
+                              ('2020-01-01T11:00:00Z', [])):
+            response = self.search('created_at__lt=' + bound)
+            self.assertEqual(response.status_code, 200, bound)
+            self.assertEqual(
+                [user['email'] for user in response.get_json()], emails)
+
+    def test_malformed_timestamp(self):
+        """Dates without a time and garbage are rejected
+        """
+        for bound in ('2024-01-01', 'yesterday'):
+            response = self.search('created_at__gte=' + bound)
+            self.assertEqual(response.status_code, 400, bound)
+
+
+class TestUpdateUser(UsersViewTestCase):
+    """PUT /api/v1/users/:id
+    """
+
+    def test_change_own_password(self):
+        """A user may change their password, revoking their sessions
+        """
+        with mock.patch.object(app_module.auth,
+                               'destroy_all_sessions') as destroy_all_sessions:
+            response = self.client.put(
+                '/api/v1/users/' + self.admin.id, json={'password': 'new'},
+                headers=self.basic('admin@hbtn.io', 'admin-pwd'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.get(self.admin.id).is_valid_password('new'))
+        destroy_all_sessions.assert_called_once_with(self.admin.id)
+
+    def test_change_password_of_another_user(self):
+        """The password of another user is left alone
+        """
+        victim = self.create_user('victim@hbtn.io', 'victim-pwd')
+        with mock.patch.object(app_module.auth,
+                               'destroy_all_sessions') as destroy_all_sessions:
+            response = self.client.put(
+                '/api/v1/users/' + victim.id,
+                json={'password': 'stolen', 'first_name': 'Eve'},
+                headers=self.basic('admin@hbtn.io', 'admin-pwd'))
+        self.assertEqual(response.status_code, 403)
+        victim = User.get(victim.id)
+        self.assertTrue(victim.is_valid_password('victim-pwd'))
+        self.assertIsNone(victim.first_name)
+        destroy_all_sessions.assert_not_called()
+
+    def test_change_name_of_another_user(self):
+        """Names of any user may still be changed
+        """
+        user = self.create_user('bob@hbtn.io', 'bob-pwd')
+        response = self.client.put(
+            '/api/v1/users/' + user.id, json={'first_name': 'Bob'},
+            headers=self.basic('admin@hbtn.io', 'admin-pwd'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.get(user.id).first_name, 'Bob')
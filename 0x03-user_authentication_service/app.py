@@ -3,9 +3,11 @@
 from flask import Flask, jsonify, request, abort, redirect
 
 from auth import Auth
+from throttle import LoginThrottle
 
 app = Flask(__name__)
 AUTH = Auth()
+THROTTLE = LoginThrottle()
 
 
 @app.route("/", methods=["GET"], strict_slashes=False)
@@ -32,6 +34,26 @@ def users() -> str:
         return jsonify({"message": "email already registered"}), 400
 
 
+@app.route("/users/bulk", methods=["POST"], strict_slashes=False)
+def users_bulk() -> str:
+    """Bulk user registration
+    Returns:
+        JSON with the created emails and per-row errors.
+    """
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list) or \
+            not all(isinstance(row, dict) for row in rows):
+        return jsonify({"message": "wrong format"}), 400
+    _, errors = AUTH.register_users(
+        (row.get("email"), row.get("password")) for row in rows)
+    failed = {error["index"] for error in errors}
+    return jsonify({
+        "created": [row.get("email") for index, row in enumerate(rows)
+                    if index not in failed],
+        "errors": errors,
+    })
+
+
 @app.route("/sessions", methods=["POST"], strict_slashes=False)
 def login() -> str:
     """User login
@@ -40,7 +62,16 @@ def login() -> str:
     """
     email = request.form.get("email")
     password = request.form.get("password")
-    if not AUTH.valid_login(email, password):
+    ip = request.remote_addr
+    status = THROTTLE.admit(ip, email)
+    if status is not None:
+        abort(status)
+    valid = False
+    try:
+        valid = AUTH.valid_login(email, password)
+    finally:
+        THROTTLE.release(ip, email, valid)
+    if not valid:
         abort(401)
     session_id = AUTH.create_session(email)
     response = jsonify({"email": email, "message": "logged in"})
@@ -105,5 +136,14 @@ def update_password() -> str:
     return jsonify({"email": email, "message": "Password updated"})
 
 
+@app.route("/metrics", methods=["GET"], strict_slashes=False)
+def metrics() -> str:
+    """Cache metrics
+    Returns:
+        JSON with the session cache size and hit rate.
+    """
+    return jsonify({"session_cache": AUTH.session_cache_stats()})
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
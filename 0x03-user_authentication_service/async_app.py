@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Flask app with basic user authentication, served by async views.
+
+Requires `flask[async]` and `aiosqlite`. Every async view runs on one
+event loop, in a background thread, whichever thread serves the
+request: the views of concurrent requests interleave on it while they
+wait for the database or the bcrypt executor, and they share one pool
+of aiosqlite connections, which are bound to the loop that opened them.
+Run it like `app.py`, under a threaded WSGI server.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future
+from flask import Flask, jsonify, request, abort, redirect
+
+from async_auth import AsyncAuth
+from throttle import LoginThrottle
+
+
+class LoopFlask(Flask):
+    """Flask app running its async views on a shared event loop."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Starts the event loop thread."""
+        super().__init__(*args, **kwargs)
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def async_to_sync(self, func):
+        """Returns a function running `func` on the shared loop, in the
+        context of the calling thread, and waiting for its result.
+        """
+        def run(*args, **kwargs):
+            # Carries the request context over to the loop thread
+            context = contextvars.copy_context()
+            future = Future()
+
+            def done(task: asyncio.Task) -> None:
+                if task.cancelled():
+                    future.cancel()
+                elif task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result())
+
+            def start() -> None:
+                task = context.run(self.loop.create_task,
+                                   func(*args, **kwargs))
+                task.add_done_callback(done)
+
+            self.loop.call_soon_threadsafe(start)
+            return future.result()
+
+        return run
+
+
+app = LoopFlask(__name__)
+AUTH = AsyncAuth()
+THROTTLE = LoginThrottle()
+app.async_to_sync(AUTH.setup)()
+
+
+@app.route("/", methods=["GET"], strict_slashes=False)
+async def index() -> str:
+    """Home route
+    Returns:
+        JSON with a welcome message.
+    """
+    return jsonify({"message": "Bienvenue"})
+
+
+@app.route("/users", methods=["POST"], strict_slashes=False)
+async def users() -> str:
+    """User registration
+    Returns:
+        JSON with registration result.
+    """
+    email = request.form.get("email")
+    password = request.form.get("password")
+    try:
+        await AUTH.register_user(email, password)
+        return jsonify({"email": email, "message": "user created"})
+    except ValueError:
+        return jsonify({"message": "email already registered"}), 400
+
+
+@app.route("/sessions", methods=["POST"], strict_slashes=False)
+async def login() -> str:
+    """User login
+    Returns:
+        JSON with login result.
+    """
+    email = request.form.get("email")
+    password = request.form.get("password")
+    ip = request.remote_addr
+    status = THROTTLE.admit(ip, email)
+    if status is not None:
+        abort(status)
+    valid = False
+    try:
+        valid = await AUTH.valid_login(email, password)
+    finally:
+        THROTTLE.release(ip, email, valid)
+    if not valid:
+        abort(401)
+    session_id = await AUTH.create_session(email)
+    response = jsonify({"email": email, "message": "logged in"})
+    response.set_cookie("session_id", session_id)
+    return response
+
+
+@app.route("/sessions", methods=["DELETE"], strict_slashes=False)
+async def logout() -> str:
+    """User logout
+    Returns:
+        Redirects to home page.
+    """
+    session_id = request.cookies.get("session_id")
+    user = await AUTH.get_user_from_session_id(session_id)
+    if user is None:
+        abort(403)
+    await AUTH.destroy_session(user.id)
+    return redirect("/")
+
+
+@app.route("/profile", methods=["GET"], strict_slashes=False)
+async def profile() -> str:
+    """User profile
+    Returns:
+        JSON with profile data.
+    """
+    session_id = request.cookies.get("session_id")
+    user = await AUTH.get_user_from_session_id(session_id)
+    if user is None:
+        abort(403)
+    return jsonify({"email": user.email})
+
+
+@app.route("/reset_password", methods=["POST"], strict_slashes=False)
+async def get_reset_password_token() -> str:
+    """Request password reset token
+    Returns:
+        JSON with reset token.
+    """
+    email = request.form.get("email")
+    try:
+        reset_token = await AUTH.get_reset_password_token(email)
+    except ValueError:
+        abort(403)
+    return jsonify({"email": email, "reset_token": reset_token})
+
+
+@app.route("/reset_password", methods=["PUT"], strict_slashes=False)
+async def update_password() -> str:
+    """Update password
+    Returns:
+        JSON with update result.
+    """
+    email = request.form.get("email")
+    reset_token = request.form.get("reset_token")
+    new_password = request.form.get("new_password")
+    try:
+        await AUTH.update_password(reset_token, new_password)
+    except ValueError:
+        abort(403)
+    return jsonify({"email": email, "message": "Password updated"})
+
+
+@app.route("/metrics", methods=["GET"], strict_slashes=False)
+async def metrics() -> str:
+    """Cache metrics
+    Returns:
+        JSON with the session cache size and hit rate.
+    """
+    return jsonify({"session_cache": AUTH.session_cache_stats()})
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Module for asynchronous authentication routines."""
+import asyncio
+import bcrypt
+from functools import partial
+from typing import Dict, Union
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import NoResultFound
+
+from async_db import AsyncDB
+from auth import SessionCache, _generate_uuid, _hash_password
+from user import User
+
+
+async def _run_blocking(func, *args):
+    """Runs a CPU-bound call on the default executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(func, *args))
+
+
+class AsyncAuth:
+    """Handles authentication operations without blocking the loop."""
+
+    def __init__(self):
+        """Sets up the AsyncAuth instance."""
+        self._db = AsyncDB()
+        self._sessions = SessionCache()
+
+    async def setup(self) -> None:
+        """Creates the missing tables, keeping the existing users."""
+        await self._db.create_tables()
+
+    async def reset(self) -> None:
+        """Recreates an empty database."""
+        await self._db.reset()
+
+    async def register_user(self, email: str, password: str) -> User:
+        """Registers a new user."""
+        hashed_password = await _run_blocking(_hash_password, password)
+        # The unique index on email turns duplicates away in the insert
+        try:
+            return await self._db.add_user(email, hashed_password)
+        except IntegrityError:
+            raise ValueError(f"User {email} already exists")
+
+    async def valid_login(self, email: str, password: str) -> bool:
+        """Validates user login."""
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            return False
+        return await _run_blocking(
+            bcrypt.checkpw, password.encode("utf-8"), user.hashed_password)
+
+    async def create_session(self, email: str) -> Union[str, None]:
+        """Creates a user session."""
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            return None
+        session_id = _generate_uuid()
+        await self._db.update_user(user.id, session_id=session_id)
+        user.session_id = session_id
+        generation = self._sessions.invalidate_user(user.id)
+        self._sessions.put(session_id, user, generation)
+        return session_id
+
+    async def get_user_from_session_id(
+            self, session_id: str) -> Union[User, None]:
+        """Finds a user by session ID."""
+        if session_id is None:
+            return None
+        user = self._sessions.get(session_id)
+        if user is not None:
+            return user
+        generation = self._sessions.generation()
+        try:
+            user = await self._db.find_user_by(session_id=session_id)
+        except NoResultFound:
+            return None
+        self._sessions.put(session_id, user, generation)
+        return user
+
+    async def destroy_session(self, user_id: int) -> None:
+        """Destroys a user's session."""
+        if user_id is not None:
+            await self._db.update_user(user_id, session_id=None)
+            self._sessions.invalidate_user(user_id)
+
+    def session_cache_stats(self) -> Dict[str, float]:
+        """Returns hit-rate metrics of the session cache."""
+        return self._sessions.stats()
+
+    async def get_reset_password_token(self, email: str) -> str:
+        """Generates a password reset token."""
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            raise ValueError()
+        reset_token = _generate_uuid()
+        await self._db.update_user(user.id, reset_token=reset_token)
+        return reset_token
+
+    async def update_password(self, reset_token: str, password: str) -> None:
+        """Updates user's password using reset token."""
+        try:
+            user = await self._db.find_user_by(reset_token=reset_token)
+        except NoResultFound:
+            raise ValueError()
+        new_password_hash = await _run_blocking(_hash_password, password)
+        await self._db.update_user(
+            user.id,
+            hashed_password=new_password_hash,
+            reset_token=None)
+        self._sessions.invalidate_user(user.id)
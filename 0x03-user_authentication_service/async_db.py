@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Async DB module.
+"""
+from sqlalchemy import select, update
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm.exc import NoResultFound
+
+from db import criterion_for
+from user import Base, User
+
+
+class AsyncDB:
+    """Async counterpart of `db.DB`, backed by aiosqlite.
+    """
+
+    def __init__(self, url: str = "sqlite+aiosqlite:///a.db") -> None:
+        """Initialize a new AsyncDB instance.
+
+        Pooled aiosqlite connections are bound to the event loop that
+        opened them, so an instance must only be used from one loop.
+        """
+        self._engine = create_async_engine(url, echo=False)
+        self._sessionmaker = async_sessionmaker(self._engine,
+                                                expire_on_commit=False)
+
+    async def create_tables(self) -> None:
+        """Creates the missing tables.
+        """
+        async with self._engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    async def reset(self) -> None:
+        """Drops and recreates all tables.
+        """
+        async with self._engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    async def add_user(self, email: str, hashed_password: bytes) -> User:
+        """Adds a new user to the database.
+
+        Raises `IntegrityError` if the email is already registered.
+        """
+        new_user = User(email=email, hashed_password=hashed_password)
+        async with self._sessionmaker() as session:
+            session.add(new_user)
+            await session.commit()
+        return new_user
+
+    async def find_user_by(self, **kwargs) -> User:
+        """Finds a user based on a set of filters.
+        """
+        if not kwargs:
+            raise InvalidRequestError()
+        stmt = select(User).where(criterion_for(frozenset(kwargs)))
+        async with self._sessionmaker() as session:
+            result = await session.execute(stmt.limit(1), kwargs)
+            user = result.scalars().first()
+        if user is None:
+            raise NoResultFound()
+        return user
+
+    async def update_user(self, user_id: int, **kwargs) -> None:
+        """Updates a user based on a given id.
+        """
+        for key in kwargs:
+            if not hasattr(User, key):
+                raise ValueError()
+        async with self._sessionmaker() as session:
+            await session.execute(
+                update(User).where(User.id == user_id).values(**kwargs))
+            await session.commit()
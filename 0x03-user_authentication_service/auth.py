@@ -1,38 +1,269 @@
 #!/usr/bin/env python3
 """Module for authentication routines."""
 import bcrypt
+import fcntl
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from threading import Lock
 from uuid import uuid4
-from typing import Union
+from typing import Dict, Iterable, List, Tuple, Union
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 
 from db import DB
 from user import User
 
+BULK_BATCH_SIZE = 1000
+SESSION_CACHE_SIZE = 4096
+SESSION_CACHE_TTL = 60
+SESSION_LOG = "a.db.sessions"
+SESSION_LOG_MAX_BYTES = 1 << 20
+
 
 def _hash_password(password: str) -> bytes:
     """Hashes the password."""
     return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
 
 
+def _try_hash_password(password: str) -> Union[bytes, None]:
+    """Hashes the password, or returns None if bcrypt rejects it."""
+    try:
+        return _hash_password(password)
+    except ValueError:
+        # Longer than 72 bytes, or not encodable as UTF-8
+        return None
+
+
 def _generate_uuid() -> str:
     """Generates a unique identifier."""
     return str(uuid4())
 
 
+class SessionCache:
+    """Bounded, TTL-based session ID to user cache.
+
+    Worker processes share the database but not their caches, so every
+    change of a user's session is appended to a log, which each cache
+    replays before answering. Every replayed change bumps a generation,
+    and a lookup started before a bump is not cached, so that it cannot
+    bring back a session destroyed while it was reading it.
+    """
+
+    def __init__(self, maxsize: int = SESSION_CACHE_SIZE,
+                 ttl: float = SESSION_CACHE_TTL,
+                 log_path: str = SESSION_LOG) -> None:
+        """Sets up an empty cache."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.log_path = log_path
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._log_position = (None, 0)
+        self._entries = OrderedDict()
+        self._session_by_user = {}
+        self._lock = Lock()
+
+    def get(self, session_id: str) -> Union[User, None]:
+        """Returns the cached user for a session ID, if still fresh."""
+        with self._lock:
+            self._sync()
+            entry = self._entries.get(session_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._discard(session_id)
+            self.misses += 1
+            return None
+
+    def generation(self) -> int:
+        """Returns the current generation, to pass to `put`."""
+        with self._lock:
+            self._sync()
+            return self._generation
+
+    def put(self, session_id: str, user: User, generation: int) -> None:
+        """Caches the user owning a session ID, read from the database
+        at `generation`, unless a session changed since.
+        """
+        with self._lock:
+            self._sync()
+            if generation != self._generation:
+                return
+            previous = self._session_by_user.get(user.id)
+            if previous is not None:
+                self._discard(previous)
+            self._entries[session_id] = (user, time.monotonic() + self.ttl)
+            self._session_by_user[user.id] = session_id
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int) -> int:
+        """Drops the cached session of a user in every process, once it
+        changed in the database, and returns the new generation.
+        """
+        with open(self.log_path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with open(self.log_path, "ab") as log:
+                log.write(b"%d\n" % user_id)
+                size = log.tell()
+            if size >= SESSION_LOG_MAX_BYTES:
+                # Readers of the former log drop their whole cache
+                open(self.log_path + ".tmp", "wb").close()
+                os.replace(self.log_path + ".tmp", self.log_path)
+        return self.generation()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the cache size and hit-rate metrics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "generation": self._generation,
+            }
+
+    def _sync(self) -> None:
+        """Replays the log since the last call; the caller must hold
+        the lock.
+        """
+        inode, offset = self._log_position
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        if st.st_ino == inode and st.st_size == offset:
+            return
+        try:
+            log = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return
+        with log:
+            st = os.fstat(log.fileno())
+            if st.st_ino != inode:
+                # A new log: changes may have been missed
+                self._entries.clear()
+                self._session_by_user.clear()
+                offset = 0
+            log.seek(offset)
+            chunk = log.read(st.st_size - offset)
+        # A writer may be halfway through a line: stop at the last one
+        end = chunk.rfind(b"\n") + 1
+        for user_id in chunk[:end].split():
+            session_id = self._session_by_user.get(int(user_id))
+            if session_id is not None:
+                self._discard(session_id)
+        self._log_position = (st.st_ino, offset + end)
+        self._generation += 1
+
+    def _discard(self, session_id: str) -> None:
+        """Removes an entry; the caller must hold the lock."""
+        user, _ = self._entries.pop(session_id)
+        if self._session_by_user.get(user.id) == session_id:
+            del self._session_by_user[user.id]
+
+
 class Auth:
     """Handles authentication operations."""
 
     def __init__(self):
         """Sets up the Auth instance."""
         self._db = DB()
+        self._sessions = SessionCache()
 
     def register_user(self, email: str, password: str) -> User:
         """Registers a new user."""
+        # The unique index on email turns duplicates away in the insert
         try:
-            self._db.find_user_by(email=email)
-        except NoResultFound:
             return self._db.add_user(email, _hash_password(password))
-        raise ValueError(f"User {email} already exists")
+        except IntegrityError:
+            raise ValueError(f"User {email} already exists")
+
+    def register_users(
+            self,
+            users: Iterable[Tuple[str, str]],
+    ) -> Tuple[List[User], List[Dict]]:
+        """Registers many users, reporting failures per row.
+        """
+        created, failures = [], []
+        seen, batch = set(), []
+        with ThreadPoolExecutor() as executor:
+            for index, (email, password) in enumerate(users):
+                if not email:
+                    failures.append(
+                        {"index": index, "email": email,
+                         "message": "email missing"})
+                elif not isinstance(email, str):
+                    failures.append(
+                        {"index": index, "email": email,
+                         "message": "email must be a string"})
+                elif not password:
+                    failures.append(
+                        {"index": index, "email": email,
+                         "message": "password missing"})
+                elif not isinstance(password, str):
+                    failures.append(
+                        {"index": index, "email": email,
+                         "message": "password must be a string"})
+                elif email in seen:
+                    failures.append(
+                        {"index": index, "email": email,
+                         "message": "email already registered"})
+                else:
+                    seen.add(email)
+                    batch.append((index, email, password))
+                if len(batch) >= BULK_BATCH_SIZE:
+                    self._register_batch(batch, executor, created, failures)
+                    batch = []
+            if batch:
+                self._register_batch(batch, executor, created, failures)
+        failures.sort(key=lambda failure: failure["index"])
+        return created, failures
+
+    def _register_batch(
+            self,
+            batch: List[Tuple[int, str, str]],
+            executor: Executor,
+            created: List[User],
+            failures: List[Dict],
+    ) -> None:
+        """Hashes and inserts one batch of new users."""
+        existing = self._db.existing_emails(email for _, email, _ in batch)
+        rows = []
+        for index, email, password in batch:
+            if email in existing:
+                failures.append({"index": index, "email": email,
+                                 "message": "email already registered"})
+            else:
+                rows.append((index, email, password))
+        hashed_rows = []
+        hashes = executor.map(_try_hash_password, [row[2] for row in rows])
+        for (index, email, _), hashed in zip(rows, hashes):
+            if hashed is None:
+                failures.append({"index": index, "email": email,
+                                 "message": "invalid password"})
+            else:
+                hashed_rows.append((index, email, hashed))
+        try:
+            created.extend(self._db.add_users(
+                [(email, hashed) for _, email, hashed in hashed_rows]))
+            return
+        except IntegrityError:
+            pass
+        # A concurrent registration won the race for some email of this
+        # batch: fall back to one insert per row to isolate the conflicts.
+        for index, email, hashed in hashed_rows:
+            try:
+                created.append(self._db.add_user(email, hashed))
+            except IntegrityError:
+                failures.append({"index": index, "email": email,
+                                 "message": "email already registered"})
 
     def valid_login(self, email: str, password: str) -> bool:
         """Validates user login."""
@@ -49,7 +280,11 @@ class Auth:
         try:
             user = self._db.find_user_by(email=email)
             session_id = _generate_uuid()
+            self._db.detach(user)
             self._db.update_user(user.id, session_id=session_id)
+            user.session_id = session_id
+            generation = self._sessions.invalidate_user(user.id)
+            self._sessions.put(session_id, user, generation)
             return session_id
         except NoResultFound:
             return None
@@ -58,15 +293,27 @@ class Auth:
         """Finds a user by session ID."""
         if session_id is None:
             return None
+        user = self._sessions.get(session_id)
+        if user is not None:
+            return user
+        generation = self._sessions.generation()
         try:
-            return self._db.find_user_by(session_id=session_id)
+            user = self._db.find_user_by(session_id=session_id)
         except NoResultFound:
             return None
+        self._db.detach(user)
+        self._sessions.put(session_id, user, generation)
+        return user
 
     def destroy_session(self, user_id: int) -> None:
         """Destroys a user's session."""
         if user_id is not None:
             self._db.update_user(user_id, session_id=None)
+            self._sessions.invalidate_user(user_id)
+
+    def session_cache_stats(self) -> Dict[str, float]:
+        """Returns hit-rate metrics of the session cache."""
+        return self._sessions.stats()
 
     def get_reset_password_token(self, email: str) -> str:
         """Generates a password reset token."""
@@ -87,5 +334,6 @@ class Auth:
                 user.id,
                 hashed_password=new_password_hash,
                 reset_token=None)
+            self._sessions.invalidate_user(user.id)
         except NoResultFound:
             raise ValueError()
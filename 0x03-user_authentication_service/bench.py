@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""Microbenchmarks of the user authentication service.
+
+With --find CALLS, `DB.find_user_by` is timed against the former
+`tuple_(...).in_(...)` query over USERS users, by email and by
+(email, session_id). The time of a full compile of each statement and
+the execute time per call are reported; executing goes through the
+engine's compiled cache, which the equality criteria can hit.
+
+With --bulk ROWS, ROWS users are registered once with one
+`Auth.register_user` call per row and once with `Auth.register_users`,
+and the rows per second of both are reported. Passwords are hashed with
+--bcrypt-rounds log rounds, 4 by default, so that the database side of
+the two paths stays visible next to bcrypt.
+
+With --register THREADS, --rows users (1000 by default) are registered
+by 1 and by THREADS concurrent clients, each email being attempted
+twice; the registrations per second, the users created and the mean
+time of a rejected duplicate are reported.
+
+With --profile REQUESTS, REQUESTS `GET /profile` requests spread over
+the sessions of USERS users are sent through the test client of
+`app.py`, with the session cache disabled and enabled; the requests per
+second, the latency and the cache hit rate are reported.
+
+Each run works on a fresh `a.db` in a temporary directory. The report
+is printed as JSON.
+
+Usage: ./bench.py [-u USERS] [--find CALLS] [--bulk ROWS]
+                  [--register THREADS] [--rows ROWS]
+                  [--profile REQUESTS] [--bcrypt-rounds ROUNDS]
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+import bcrypt
+from sqlalchemy import tuple_
+
+os.chdir(tempfile.mkdtemp(prefix="bench_"))
+
+from auth import Auth, SessionCache  # noqa: E402
+from db import DB, criterion_for  # noqa: E402
+from user import User  # noqa: E402
+
+HASHED_PASSWORD = b"$2b$04$" + b"x" * 53
+PASSWORD = "bench-pwd"
+
+
+def seed(db: DB, users: int) -> None:
+    """Inserts `users` users, each with a session ID."""
+    db._session.bulk_insert_mappings(User, [
+        {"email": "user{}@bench.io".format(i),
+         "hashed_password": HASHED_PASSWORD,
+         "session_id": "session-{}".format(i)}
+        for i in range(users)])
+    db._session.commit()
+
+
+def per_call_us(func: Callable, calls: int) -> float:
+    """Returns the mean time of a call to `func`, in microseconds."""
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def bench_find(users: int, calls: int) -> Dict:
+    """Times `find_user_by` against a per-call row-value IN query."""
+    db = DB()
+    seed(db, users)
+    session = db._session
+    dialect = db._engine.dialect
+    picks = [random.randrange(users) for _ in range(calls)]
+    report = {"users": users, "calls": calls}
+    for name, keys in (("email", ("email",)),
+                       ("email_session_id", ("email", "session_id"))):
+        lookups = [{"email": "user{}@bench.io".format(i),
+                    "session_id": "session-{}".format(i)} for i in picks]
+        lookups = [{key: lookup[key] for key in keys} for lookup in lookups]
+
+        def tuple_in(kwargs: Dict[str, str]):
+            fields = [getattr(User, key) for key in kwargs]
+            return session.query(User).filter(
+                tuple_(*fields).in_([tuple(kwargs.values())]))
+
+        def criterion(kwargs: Dict[str, str]):
+            return session.query(User).filter(
+                criterion_for(frozenset(kwargs))).params(**kwargs)
+
+        report[name] = {}
+        for query, run in (
+                (tuple_in, lambda kwargs: tuple_in(kwargs).first()),
+                (criterion, lambda kwargs: db.find_user_by(**kwargs))):
+            calls_left = iter(lookups)
+            compile_us = per_call_us(lambda: query(
+                next(calls_left)).statement.compile(dialect=dialect), calls)
+            calls_left = iter(lookups)
+            execute_us = per_call_us(lambda: run(next(calls_left)), calls)
+            report[name][query.__name__] = {"compile_us": compile_us,
+                                            "execute_us": execute_us}
+    return report
+
+
+def bench_bulk(rows: int) -> Dict:
+    """Times bulk registration against one registration per row."""
+    emails = ["user{}@bench.io".format(i) for i in range(rows)]
+    report = {"rows": rows}
+    for name in ("register_user", "register_users"):
+        auth = Auth()
+        start = time.perf_counter()
+        if name == "register_user":
+            for email in emails:
+                auth.register_user(email, PASSWORD)
+            failures = []
+        else:
+            _, failures = auth.register_users(
+                (email, PASSWORD) for email in emails)
+        elapsed = time.perf_counter() - start
+        report[name] = {"seconds": elapsed, "failures": len(failures),
+                        "rows_per_s": rows / elapsed}
+    return report
+
+
+def bench_register(rows: int, threads: int) -> Dict:
+    """Times concurrent registrations, half of them duplicates."""
+    emails = ["user{}@bench.io".format(i) for i in range(rows)] * 2
+    report = {"rows": len(emails)}
+    for clients in (1, threads):
+        auth = Auth()
+        rejected = []
+
+        def register(email: str) -> bool:
+            start = time.perf_counter()
+            try:
+                auth.register_user(email, PASSWORD)
+            except ValueError:
+                rejected.append(time.perf_counter() - start)
+                return False
+            return True
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            created = sum(executor.map(register, emails))
+        elapsed = time.perf_counter() - start
+        report["{}_clients".format(clients)] = {
+            "seconds": elapsed,
+            "created": created,
+            "registrations_per_s": len(emails) / elapsed,
+            "duplicate_us": sum(rejected) / max(1, len(rejected)) * 1e6,
+        }
+    return report
+
+
+def bench_profile(users: int, requests: int) -> Dict:
+    """Times `GET /profile` without and with the session cache."""
+    import app as app_module
+
+    auth = app_module.AUTH
+    client = app_module.app.test_client(use_cookies=False)
+    seed(auth._db, users)
+    session_ids = ["session-{}".format(i) for i in range(users)]
+    report = {"users": users, "requests": requests}
+    for name, maxsize in (("uncached", 0), ("cached", users)):
+        auth._sessions = SessionCache(maxsize=maxsize)
+        latencies, statuses = [], {}
+        for i in range(requests):
+            headers = {"Cookie": "session_id=" + session_ids[i % users]}
+            start = time.perf_counter()
+            response = client.get("/profile", headers=headers)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = \
+                statuses.get(response.status_code, 0) + 1
+        latencies.sort()
+        report[name] = {
+            "statuses": statuses,
+            "rps": requests / sum(latencies),
+            "p50_us": latencies[requests // 2] * 1e6,
+            "p99_us": latencies[int(requests * 0.99)] * 1e6,
+            "hit_rate": auth.session_cache_stats()["hit_rate"],
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-u", "--users", type=int, default=10000)
+    parser.add_argument("--find", type=int, metavar="CALLS")
+    parser.add_argument("--bulk", type=int, metavar="ROWS")
+    parser.add_argument("--register", type=int, metavar="THREADS")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--profile", type=int, metavar="REQUESTS")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    args = parser.parse_args()
+    bcrypt.gensalt = functools.partial(bcrypt.gensalt, args.bcrypt_rounds)
+    if args.profile:
+        report = bench_profile(args.users, args.profile)
+    elif args.register:
+        report = bench_register(args.rows, args.register)
+    elif args.bulk:
+        report = bench_bulk(args.bulk)
+    else:
+        report = bench_find(args.users, args.find or 2000)
+    json.dump(report, sys.stdout, indent=2)
+    print()
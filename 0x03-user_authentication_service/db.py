@@ -1,15 +1,33 @@
 #!/usr/bin/env python3
 """DB module.
 """
-from sqlalchemy import create_engine, tuple_
+from functools import lru_cache
+from typing import FrozenSet, Iterable, List, Set, Tuple
+
+from sqlalchemy import and_, bindparam, create_engine
 from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.session import Session
+from sqlalchemy.sql.elements import ClauseElement
 
 from user import Base, User
 
+IN_CHUNK_SIZE = 500
+
+
+@lru_cache(maxsize=None)
+def criterion_for(keys: FrozenSet[str]) -> ClauseElement:
+    """Returns the memoized equality criterion for a set of user fields.
+    """
+    clauses = []
+    for key in sorted(keys):
+        if not hasattr(User, key):
+            raise InvalidRequestError()
+        clauses.append(getattr(User, key) == bindparam(key))
+    return and_(*clauses)
+
 
 class DB:
     """DB class.
@@ -25,42 +43,69 @@ class DB:
 
     @property
     def _session(self) -> Session:
-        """Memoized session object.
+        """Memoized, thread-local session object.
         """
         if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+            self.__session = scoped_session(sessionmaker(bind=self._engine))
+        return self.__session()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """Adds a new user to the database.
+
+        Raises `IntegrityError` if the email is already registered.
         """
+        new_user = User(email=email, hashed_password=hashed_password)
         try:
-            new_user = User(email=email, hashed_password=hashed_password)
             self._session.add(new_user)
             self._session.commit()
         except Exception:
             self._session.rollback()
-            new_user = None
+            raise
         return new_user
 
+    def add_users(self, users: List[Tuple[str, bytes]]) -> List[User]:
+        """Adds several users to the database in a single transaction.
+        """
+        new_users = [User(email=email, hashed_password=hashed_password)
+                     for email, hashed_password in users]
+        try:
+            self._session.add_all(new_users)
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
+        return new_users
+
+    def existing_emails(self, emails: Iterable[str]) -> Set[str]:
+        """Returns the subset of the given emails that are registered.
+        """
+        emails = list(emails)
+        found = set()
+        for i in range(0, len(emails), IN_CHUNK_SIZE):
+            chunk = emails[i:i + IN_CHUNK_SIZE]
+            rows = self._session.query(User.email).filter(
+                User.email.in_(chunk))
+            found.update(email for email, in rows)
+        return found
+
     def find_user_by(self, **kwargs) -> User:
         """Finds a user based on a set of filters.
         """
-        fields, values = [], []
-        for key, value in kwargs.items():
-            if hasattr(User, key):
-                fields.append(getattr(User, key))
-                values.append(value)
-            else:
-                raise InvalidRequestError()
+        if not kwargs:
+            raise InvalidRequestError()
+        criterion = criterion_for(frozenset(kwargs))
         result = self._session.query(User).filter(
-            tuple_(*fields).in_([tuple(values)])
-        ).first()
+            criterion).params(**kwargs).first()
         if result is None:
             raise NoResultFound()
         return result
 
+    def detach(self, user: User) -> None:
+        """Detaches a loaded user from the session so that it can be
+        cached and read without triggering a refresh.
+        """
+        self._session.expunge(user)
+
     def update_user(self, user_id: int, **kwargs) -> None:
         """Updates a user based on a given id.
         """
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Offline load test for `app.py` built from the `main.py` flows.
+
+Every virtual user runs the `main.py` scenario with its own email,
+from its own client address, against the Flask app in-process, through
+its test client, and the latency of every request is recorded per route.
+
+Usage: ./load_test.py [-u USERS] [-c CONCURRENCY] [-a APP_MODULE]
+"""
+import argparse
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+import main
+
+
+class _Response:
+    """The subset of `requests.Response` used by `main.py`."""
+
+    def __init__(self, response) -> None:
+        """Wraps a Flask test response."""
+        self.status_code = response.status_code
+        self._json = response.get_json(silent=True)
+        cookies = SimpleCookie()
+        for header in response.headers.getlist("Set-Cookie"):
+            cookies.load(header)
+        self.cookies = {key: morsel.value for key, morsel in cookies.items()}
+
+    def json(self) -> Dict:
+        """Returns the decoded JSON body."""
+        return self._json
+
+
+class _Client:
+    """Stands in for the `requests` module inside `main.py`.
+
+    Requests are routed to a per-thread Flask test client, from the
+    address of the virtual user the thread runs, and their latency is
+    recorded under "METHOD /path".
+    """
+
+    def __init__(self, app) -> None:
+        """Sets up the client for a Flask app."""
+        self._app = app
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+
+    def _request(self, method: str, url: str, data: Dict = None,
+                 cookies: Dict = None) -> _Response:
+        """Sends one request and records its latency."""
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._app.test_client(use_cookies=False)
+            self._local.client = client
+        path = urlsplit(url).path
+        headers = {}
+        if cookies:
+            headers["Cookie"] = "; ".join(
+                "{}={}".format(key, value) for key, value in cookies.items())
+        start = time.perf_counter()
+        response = client.open(
+            path, method=method, data=data, headers=headers,
+            environ_base={"REMOTE_ADDR": self._local.remote_addr},
+            follow_redirects=True)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies.setdefault(
+                "{} {}".format(method, path), []).append(elapsed)
+        return _Response(response)
+
+    def run_as(self, n: int, scenario) -> None:
+        """Runs `scenario(n)` from the address of the n-th virtual user."""
+        self._local.remote_addr = "10.{}.{}.{}".format(
+            n >> 16 & 255, n >> 8 & 255, n & 255)
+        scenario(n)
+
+    def get(self, url: str, **kwargs) -> _Response:
+        """Sends a GET request."""
+        return self._request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> _Response:
+        """Sends a POST request."""
+        return self._request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> _Response:
+        """Sends a PUT request."""
+        return self._request("PUT", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> _Response:
+        """Sends a DELETE request."""
+        return self._request("DELETE", url, **kwargs)
+
+
+def virtual_user(n: int) -> None:
+    """Runs the `main.py` scenario for the n-th virtual user."""
+    email = "user{}@loadtest.io".format(n)
+    main.register_user(email, main.PASSWD)
+    main.log_in_wrong_password(email, main.NEW_PASSWD)
+    main.profile_unlogged()
+    session_id = main.log_in(email, main.PASSWD)
+    main.profile_logged(session_id)
+    main.log_out(session_id)
+    reset_token = main.reset_password_token(email)
+    main.update_password(email, reset_token, main.NEW_PASSWD)
+    main.log_in(email, main.NEW_PASSWD)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Returns a nearest-rank percentile of sorted values."""
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def run(app, users: int, concurrency: int) -> Dict:
+    """Runs the load test and returns the report."""
+    client = _Client(app)
+    main.requests = client
+    failures = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(client.run_as, n, virtual_user)
+                   for n in range(users)]
+        for future in futures:
+            if future.exception() is not None:
+                failures += 1
+    elapsed = time.perf_counter() - start
+    routes = {}
+    for route, latencies in sorted(client.latencies.items()):
+        latencies.sort()
+        routes[route] = {
+            "requests": len(latencies),
+            "rps": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p90_ms": percentile(latencies, 0.90) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+        }
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "users": users,
+        "concurrency": concurrency,
+        "failed_users": failures,
+        "seconds": elapsed,
+        "requests": total,
+        "rps": total / elapsed,
+        "routes": routes,
+    }
+
+
+def print_report(report: Dict) -> None:
+    """Prints a report as a table."""
+    print("{users} users, concurrency {concurrency}, "
+          "{failed_users} failed, {requests} requests in {seconds:.2f}s "
+          "({rps:.1f} req/s)".format(**report))
+    print("{:<24} {:>8} {:>9} {:>9} {:>9} {:>9}".format(
+        "route", "requests", "req/s", "p50 ms", "p90 ms", "p99 ms"))
+    for route, stats in report["routes"].items():
+        print("{:<24} {requests:>8} {rps:>9.1f} {p50_ms:>9.2f} "
+              "{p90_ms:>9.2f} {p99_ms:>9.2f}".format(route, **stats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-u", "--users", type=int, default=50)
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("-a", "--app", default="app",
+                        help="module exposing the Flask `app`")
+    args = parser.parse_args()
+    module = importlib.import_module(args.app)
+    print_report(run(module.app, args.users, args.concurrency))
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Tests of the `auth` module.
+
+Run from the project directory: python -m pytest tests
+"""
+import functools
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import bcrypt
+
+import auth
+from auth import Auth
+
+FAST_GENSALT = functools.partial(bcrypt.gensalt, 4)
+
+
+class AuthTestCase(unittest.TestCase):
+    """Runs each test against a fresh `a.db` in a temporary directory."""
+
+    def setUp(self) -> None:
+        """Creates the database and speeds up bcrypt."""
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        patcher = mock.patch.object(bcrypt, "gensalt", FAST_GENSALT)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.auth = Auth()
+
+    def tearDown(self) -> None:
+        """Removes the database."""
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+
+class TestRegisterUser(AuthTestCase):
+    """Tests of `Auth.register_user`."""
+
+    def test_duplicate_is_rejected_by_the_insert(self) -> None:
+        """A registered email raises ValueError without a lookup before
+        the insert.
+        """
+        self.auth.register_user("bob@bob.com", "pwd")
+        with mock.patch.object(self.auth._db, "existing_emails") as lookup, \
+                mock.patch.object(self.auth._db, "find_user_by") as find:
+            with self.assertRaises(ValueError):
+                self.auth.register_user("bob@bob.com", "other")
+        lookup.assert_not_called()
+        find.assert_not_called()
+        self.assertTrue(self.auth.valid_login("bob@bob.com", "pwd"))
+
+    def test_concurrent_registrations(self) -> None:
+        """Parallel clients registering the same emails create each
+        user exactly once and get ValueError for every other attempt.
+        """
+        emails = ["user{}@test.io".format(i % 20) for i in range(200)]
+
+        def register(email: str) -> bool:
+            try:
+                self.auth.register_user(email, "pwd")
+            except ValueError:
+                return False
+            return True
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            created = list(executor.map(register, emails))
+        self.assertEqual(sum(created), 20)
+        self.assertEqual(self.auth._db.existing_emails(emails), set(emails))
+        for email in set(emails):
+            self.assertTrue(self.auth.valid_login(email, "pwd"))
+
+
+class TestSessionCache(AuthTestCase):
+    """Tests of the session cache, with `self.other` standing for a
+    second worker process sharing the database.
+    """
+
+    def setUp(self) -> None:
+        """Registers a user and starts a second worker."""
+        super().setUp()
+        self.other = Auth()
+        self.user = self.auth.register_user("bob@bob.com", "pwd")
+        self.session_id = self.auth.create_session("bob@bob.com")
+
+    def test_logout_reaches_other_workers(self) -> None:
+        """A session destroyed by a worker is not served from the cache
+        of another one.
+        """
+        self.assertIsNotNone(
+            self.other.get_user_from_session_id(self.session_id))
+        self.assertEqual(self.other.session_cache_stats()["size"], 1)
+        self.auth.destroy_session(self.user.id)
+        self.assertIsNone(
+            self.other.get_user_from_session_id(self.session_id))
+
+    def test_lookup_racing_logout_is_not_cached(self) -> None:
+        """A lookup that read the session before a logout does not put
+        it back in the cache.
+        """
+        find_user_by = self.other._db.find_user_by
+
+        def find_then_logout(**kwargs):
+            user = find_user_by(**kwargs)
+            self.auth.destroy_session(self.user.id)
+            return user
+
+        with mock.patch.object(self.other._db, "find_user_by",
+                               find_then_logout):
+            self.other.get_user_from_session_id(self.session_id)
+        self.assertIsNone(
+            self.other.get_user_from_session_id(self.session_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
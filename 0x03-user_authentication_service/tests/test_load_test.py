@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Tests of the `load_test` harness.
+
+Run from the project directory: python -m pytest tests
+"""
+import importlib
+import unittest
+from unittest import mock
+
+import load_test
+from test_auth import AuthTestCase
+from throttle import LoginThrottle
+
+
+class TestLoadTest(AuthTestCase):
+    """Runs the harness against `app.py` with a fresh database."""
+
+    def setUp(self) -> None:
+        """Points the app at the test database and a fresh throttle."""
+        super().setUp()
+        # Imported here so that the database it opens is a temporary one
+        self.app = importlib.import_module("app")
+        for name, value in (("AUTH", self.auth),
+                            ("THROTTLE", LoginThrottle())):
+            patcher = mock.patch.object(self.app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_every_virtual_user_passes(self) -> None:
+        """The logins of the virtual users are not throttled."""
+        report = load_test.run(self.app.app, 60, 8)
+        self.assertEqual(report["failed_users"], 0)
+        self.assertEqual(report["routes"]["POST /sessions"]["requests"],
+                         180)
+
+
+if __name__ == "__main__":
+    unittest.main()
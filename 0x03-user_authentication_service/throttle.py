@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Brute-force throttling and admission control for logins."""
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Union
+
+FAILURES_PER_IP_RATE = 1.0
+FAILURES_PER_IP_BURST = 20
+FAILURES_PER_EMAIL_RATE = 0.1
+FAILURES_PER_EMAIL_BURST = 5
+THROTTLE_MAX_KEYS = 100000
+MAX_PENDING_LOGINS = 8
+
+
+class TokenBuckets:
+    """Token buckets keyed by client, kept in a bounded LRU."""
+
+    def __init__(self, rate: float, burst: float,
+                 max_keys: int = THROTTLE_MAX_KEYS) -> None:
+        """Sets up buckets refilled at `rate` tokens per second."""
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def _refill(self, key: str, now: float) -> Union[list, None]:
+        """Returns the refilled bucket of a key, None once it is full."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return None
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] >= self.burst:
+            del self._buckets[key]
+            return None
+        self._buckets.move_to_end(key)
+        return bucket
+
+    def has_token(self, key: str, now: float) -> bool:
+        """Tells whether a key may make an attempt."""
+        bucket = self._refill(key, now)
+        return bucket is None or bucket[0] >= 1
+
+    def take(self, key: str, now: float) -> None:
+        """Consumes one token of a key."""
+        bucket = self._refill(key, now)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+        bucket[0] = max(0.0, bucket[0] - 1)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class LoginThrottle:
+    """Rejects logins before bcrypt runs when abused or overloaded.
+
+    Failed logins drain a bucket per client IP and one per email; while
+    either is empty, attempts get a 429. A client that already logged
+    in as an email from the same IP skips the bucket of that email, so
+    that failures sent for it by others do not lock it out. At most
+    `max_pending` password checks run at once, further logins get a 503.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING_LOGINS) -> None:
+        """Sets up empty buckets."""
+        self.by_ip = TokenBuckets(FAILURES_PER_IP_RATE,
+                                  FAILURES_PER_IP_BURST)
+        self.by_email = TokenBuckets(FAILURES_PER_EMAIL_RATE,
+                                     FAILURES_PER_EMAIL_BURST)
+        self.trusted = OrderedDict()
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = Lock()
+
+    def admit(self, ip: str, email: str) -> Union[int, None]:
+        """Returns None if admitted, else the HTTP status to reject with."""
+        now = time.monotonic()
+        with self._lock:
+            if not self.by_ip.has_token(ip, now) or (
+                    (ip, email) not in self.trusted and
+                    not self.by_email.has_token(email, now)):
+                return 429
+            if self.pending >= self.max_pending:
+                return 503
+            self.pending += 1
+        return None
+
+    def release(self, ip: str, email: str, success: bool) -> None:
+        """Records the outcome of an admitted login."""
+        now = time.monotonic()
+        with self._lock:
+            self.pending -= 1
+            if success:
+                self.trusted[(ip, email)] = True
+                self.trusted.move_to_end((ip, email))
+                while len(self.trusted) > THROTTLE_MAX_KEYS:
+                    self.trusted.popitem(last=False)
+            else:
+                self.by_ip.take(ip, now)
+                self.by_email.take(email, now)
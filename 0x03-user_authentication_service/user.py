@@ -10,7 +10,7 @@ class User(Base):
     """Maps to the `users` table."""
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
-    email = Column(String(250), nullable=False)
+    email = Column(String(250), nullable=False, unique=True)
     hashed_password = Column(String(250), nullable=False)
-    session_id = Column(String(250), nullable=True)
-    reset_token = Column(String(250), nullable=True)
+    session_id = Column(String(250), nullable=True, index=True)
+    reset_token = Column(String(250), nullable=True, index=True)